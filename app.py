@@ -1,19 +1,13 @@
 import streamlit as st
-import pdfplumber  # ADD THIS LINE - for PDF text extraction
 import pandas as pd
-import fitz  # PyMuPDF for PDF text extraction
-import fitz  # PyMuPDF
-import pytesseract
-import io
-import difflib
-import re
 import os
-import json
+import tempfile
 from hsn_lookup import HSNLookup
-from tax_calc import compute_line, money # type: ignore
-from invoice_generator import generate_invoice_pdf, generate_invoice_csv_bytes
-from utils import ocr_extract_invoice_items, normalize_item_dicts # type: ignore
-from PIL import Image
+from tax_calc import compute_lines, sum_money, ROUND_PER_LINE # type: ignore
+from invoice_generator import (generate_invoice_pdf, generate_invoice_csv_bytes, # type: ignore
+                               EXPORT_FORMATS, dataframe_fingerprint, export_dataframe_bytes,
+                               invoice_fingerprint)
+from bulk_processor import MERGED_COLUMNS, invoice_totals, process_bulk_files, render_invoice_pdfs_zip
 
 # ---------------------------------------------------
 # PAGE CONFIG
@@ -32,6 +26,9 @@ COMPANY_INFO = {
     "logo_path": "data/logo.png"  # optional, will be shown if exists
 }
 
+# GST rounding policy: ROUND_PER_LINE or ROUND_PER_INVOICE (see tax_calc.py)
+GST_ROUNDING = ROUND_PER_LINE
+
 # ---------------------------------------------------
 # CUSTOM CSS STYLING
 # ---------------------------------------------------
@@ -135,7 +132,43 @@ st.write("Generate authentic GST invoices with automatic HSN lookup, tax calcula
 # ---------------------------------------------------
 # LOAD HSN LOOKUP
 # ---------------------------------------------------
-hsn = HSNLookup("Data/HSN DATA 400.csv")
+HSN_CSV_PATH = "Data/HSN DATA 400.csv"
+
+@st.cache_resource(max_entries=1, show_spinner="Loading HSN dataset...")
+def load_hsn_lookup(csv_path, mtime):
+    """Parse the HSN dataset once per process; mtime is part of the cache key so edits reload it."""
+    return HSNLookup.load_cached(csv_path, snapshot=True)
+
+hsn = load_hsn_lookup(HSN_CSV_PATH, os.path.getmtime(HSN_CSV_PATH))
+
+# ---------------------------------------------------
+# LAZY, MEMOISED EXPORTS
+# ---------------------------------------------------
+@st.cache_data(max_entries=16, show_spinner="Preparing download...")
+def build_bulk_export(fingerprint, fmt, _df):
+    """Export bytes for the merged dataset; fingerprint is the cache key (_df is not hashed)."""
+    return export_dataframe_bytes(_df, fmt)
+
+@st.cache_data(max_entries=16, show_spinner="Preparing download...")
+def build_invoice_export(fingerprint, fmt, _invoice):
+    """PDF/CSV bytes for a generated invoice, cached by its fingerprint."""
+    if fmt == "pdf":
+        return generate_invoice_pdf(_invoice)
+    return generate_invoice_csv_bytes(_invoice)
+
+def lazy_download_button(label, key, fingerprint, build, file_name, mime):
+    """Show a "Prepare" button until the user asks for this export, then a download button.
+
+    build() only runs once requested; it is expected to be memoised on fingerprint, so
+    reruns reuse the bytes until the underlying data changes.
+    """
+    prepared = st.session_state.setdefault("prepared_exports", {})
+    if prepared.get(key) != fingerprint:
+        if not st.button(f"Prepare {label}", key=f"prepare_{key}"):
+            return
+        prepared[key] = fingerprint
+    st.download_button(f"⬇️ Download {label}", data=build(), file_name=file_name,
+                       mime=mime, key=f"download_{key}")
 
 # ---------------------------------------------------
 # SINGLE INVOICE SECTION (Multiple Products)
@@ -199,63 +232,70 @@ for i, it in enumerate(items):
 # ---------------------------------------------------
 # GENERATE INVOICE
 # ---------------------------------------------------
+# Identifies the inputs a generated invoice was built from, so it is only shown
+# (and its exports reused) while those inputs are unchanged
+invoice_inputs = (seller_name, buyer_name, customer_id, [dict(it) for it in items])
+
 if st.button("Generate Invoice"):
     if not items:
         st.warning("Please add at least one item to generate the invoice.")
     else:
-        totals = {"taxable_value": 0, "cgst": 0, "sgst": 0, "igst": 0, "grand_total": 0}
-        lines = []
-        sr = 1
-
-        for it in items:
-            res = compute_line(it['qty'], it['unit_price'], it['rate'], "Maharashtra", "Karnataka")
-            line = {
-                **it,
-                "sr": sr,
-                "rate": float(it['rate']),
-                "taxable": float(res['taxable']),
-                "cgst": float(res['cgst']),
-                "sgst": float(res['sgst']),
-                "igst": float(res['igst']),
-                "line_total": float(res['line_total'])
-            }
-            lines.append(line)
-            for k in totals.keys():
-                if k in res:
-                    totals[k] += res[k]
-            totals["grand_total"] += res["line_total"]
-            sr += 1
-
-        invoice = {
-            "invoice_number": f"INV-{customer_id}",
-            "date": "2025-10-07",
-            "seller": {"name": seller_name, "gstin": COMPANY_INFO["gstin"], "state": "Maharashtra"},
-            "buyer": {"name": buyer_name, "gstin": "", "state": "Karnataka"},
-            "items": lines,
-            "totals": {k: float(money(v)) for k, v in totals.items()}
-        }
-
-        # Show invoice summary box
-        st.markdown(f"""
-        <div class="summary-box">
-            Subtotal: ₹{totals['taxable_value']:.2f}<br>
-            CGST: ₹{totals['cgst']:.2f} | SGST: ₹{totals['sgst']:.2f} | IGST: ₹{totals['igst']:.2f}<br>
-            <b>Grand Total: ₹{totals['grand_total']:.2f}</b>
-        </div>
-        """, unsafe_allow_html=True)
+        try:
+            line_amounts, totals = compute_lines([it['qty'] for it in items],
+                                                 [it['unit_price'] for it in items],
+                                                 [it['rate'] for it in items],
+                                                 "Maharashtra", "Karnataka", rounding=GST_ROUNDING)
+        except ValueError as e:
+            # e.g. a catalog row with a blank GST rate
+            st.error(f"Cannot compute GST: {e}. Check each item's quantity, price and GST rate.")
+        else:
+            lines = []
+            for sr, (it, res) in enumerate(zip(items, line_amounts.to_dict("records")), start=1):
+                lines.append({
+                    **it,
+                    "sr": sr,
+                    "rate": float(it['rate']),
+                    "taxable": res['taxable'],
+                    "cgst": res['cgst'],
+                    "sgst": res['sgst'],
+                    "igst": res['igst'],
+                    "line_total": res['line_total']
+                })
 
-        # Download buttons
-        col1, col2 = st.columns(2)
-        with col1:
-            st.download_button("📄 Download Invoice (PDF)",
-                               data=generate_invoice_pdf(invoice),
-                               file_name=f"invoice_{customer_id}.pdf",
-                               mime="application/pdf")
-        with col2:
-            st.download_button("📊 Download Invoice (CSV)",
-                               data=generate_invoice_csv_bytes(invoice),
-                               file_name=f"invoice_{customer_id}.csv",
-                               mime="text/csv")
+            st.session_state.generated_invoice = {
+                "invoice_number": f"INV-{customer_id}",
+                "date": "2025-10-07",
+                "seller": {"name": seller_name, "gstin": COMPANY_INFO["gstin"], "state": "Maharashtra"},
+                "buyer": {"name": buyer_name, "gstin": "", "state": "Karnataka"},
+                "items": lines,
+                "totals": totals
+            }
+            st.session_state.generated_invoice_inputs = invoice_inputs
+
+if st.session_state.get("generated_invoice") and st.session_state.get("generated_invoice_inputs") == invoice_inputs:
+    invoice = st.session_state.generated_invoice
+    totals = invoice["totals"]
+
+    # Show invoice summary box
+    st.markdown(f"""
+    <div class="summary-box">
+        Subtotal: ₹{totals['taxable_value']:.2f}<br>
+        CGST: ₹{totals['cgst']:.2f} | SGST: ₹{totals['sgst']:.2f} | IGST: ₹{totals['igst']:.2f}<br>
+        <b>Grand Total: ₹{totals['grand_total']:.2f}</b>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Download buttons (rendered on first request, then reused until the invoice changes)
+    fingerprint = invoice_fingerprint(invoice)
+    col1, col2 = st.columns(2)
+    with col1:
+        lazy_download_button("Invoice (PDF)", "invoice_pdf", fingerprint,
+                             lambda: build_invoice_export(fingerprint, "pdf", invoice),
+                             file_name=f"invoice_{customer_id}.pdf", mime="application/pdf")
+    with col2:
+        lazy_download_button("Invoice (CSV)", "invoice_csv", fingerprint,
+                             lambda: build_invoice_export(fingerprint, "csv", invoice),
+                             file_name=f"invoice_{customer_id}.csv", mime="text/csv")
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -274,236 +314,85 @@ uploaded_bulk = st.file_uploader(
     accept_multiple_files=True
 )
 
-all_records = []
-
-# -------------------------
-# Field Extraction Functions
-# -------------------------
-def extract_fields_from_text(text, filename):
-    """Extract Seller, Buyer, Invoice No from text using regex patterns"""
-    fields = {
-        "seller": COMPANY_INFO["name"],  # Default to our company
-        "buyer": "Unknown Buyer",
-        "invoice_no": f"INV-{filename.split('.')[0]}",
-        "items": []
-    }
-    
-    if not text:
-        return fields
-    
-    # Patterns for field extraction
-    patterns = {
-        "seller": [
-            r"(?i)Seller\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)From\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Supplier\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Vendor\s*[:\-]\s*([^\n\r]+)",
-        ],
-        "buyer": [
-            r"(?i)Buyer\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Bill\s*To\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Customer\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Client\s*[:\-]\s*([^\n\r]+)",
-            r"(?i)Sold\s*To\s*[:\-]\s*([^\n\r]+)",
-        ],
-        "invoice_no": [
-            r"(?i)Invoice\s*No\.?\s*[:\-]\s*([A-Za-z0-9\-_/]+)",
-            r"(?i)Inv\s*#?\s*[:\-]\s*([A-Za-z0-9\-_/]+)",
-            r"(?i)Invoice\s*[:\-]\s*([A-Za-z0-9\-_/]+)",
-            r"(?i)Bill\s*No\.?\s*[:\-]\s*([A-Za-z0-9\-_/]+)",
-        ]
-    }
-    
-    # Extract Seller
-    for pattern in patterns["seller"]:
-        match = re.search(pattern, text)
-        if match:
-            seller_name = match.group(1).strip()
-            seller_name = re.sub(r'[,\-]\s*(GSTIN|GST|State|Address).*', '', seller_name, flags=re.IGNORECASE)
-            seller_name = seller_name.strip(' ,:-')
-            if seller_name and len(seller_name) > 3:
-                fields["seller"] = seller_name
-            break
-    
-    # Extract Buyer
-    for pattern in patterns["buyer"]:
-        match = re.search(pattern, text)
-        if match:
-            buyer_name = match.group(1).strip()
-            buyer_name = re.sub(r'[,\-]\s*(GSTIN|GST|State|Address).*', '', buyer_name, flags=re.IGNORECASE)
-            buyer_name = buyer_name.strip(' ,:-')
-            if buyer_name and len(buyer_name) > 3:
-                fields["buyer"] = buyer_name
-            break
-    
-    # Extract Invoice Number
-    for pattern in patterns["invoice_no"]:
-        match = re.search(pattern, text)
-        if match:
-            invoice_no = match.group(1).strip()
-            if invoice_no and len(invoice_no) > 3:
-                fields["invoice_no"] = invoice_no
-            break
-    
-    return fields
-
-def extract_text_from_file(file_bytes, filename):
-    """Extract text from different file types"""
-    try:
-        if filename.lower().endswith(".pdf"):
-            # Extract text from PDF
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            text = ""
-            for page in doc:
-                text += page.get_text() + "\n"
-            doc.close()
-            return text
-            
-        elif filename.lower().endswith((".png", ".jpg", ".jpeg")):
-            # Extract text from image using OCR
-            img = Image.open(io.BytesIO(file_bytes))
-            text = pytesseract.image_to_string(img)
-            return text
-            
-        elif filename.lower().endswith(".csv"):
-            # For CSV, read as string
-            df = pd.read_csv(io.BytesIO(file_bytes))
-            return df.astype(str).to_string(index=False)
-            
-        elif filename.lower().endswith(".xlsx"):
-            # For Excel, read as string
-            df = pd.read_excel(io.BytesIO(file_bytes))
-            return df.astype(str).to_string(index=False)
-            
-    except Exception as e:
-        st.error(f"Text extraction error for {filename}: {e}")
-    
-    return ""
+generated_records = pd.DataFrame(columns=MERGED_COLUMNS)
+# Processed bulk rows survive reruns (e.g. clicking a download button)
+record_frames = st.session_state.get("bulk_record_frames", [])
 
 # Include generated invoice in bulk (if it exists)
 if "invoice_items" in st.session_state and st.session_state.invoice_items:
     invoice_id = customer_id or "GEN-001"
-    
-    for it in st.session_state.invoice_items:
-        if it.get("description") and it.get("qty", 0) > 0:
-            rate = it.get("rate", 0)
-            res = compute_line(it["qty"], it["unit_price"], rate, "Maharashtra", "Karnataka")
-            all_records.append({
+    gen_items = pd.DataFrame([it for it in st.session_state.invoice_items
+                              if it.get("description") and it.get("qty", 0) > 0],
+                             columns=["description", "hsn", "rate", "qty", "unit_price"])
+    if not gen_items.empty:
+        gen_items = gen_items.fillna({"hsn": "", "unit_price": 0.0})
+        try:
+            line_amounts, _ = compute_lines(gen_items["qty"], gen_items["unit_price"], gen_items["rate"],
+                                            "Maharashtra", "Karnataka", rounding=GST_ROUNDING)
+        except ValueError as e:
+            st.error(f"Generated invoice left out of the merge: {e}")
+        else:
+            generated_records = pd.DataFrame({
                 "SourceFile": "Generated Invoice",
                 "Seller": COMPANY_INFO["name"],
                 "Buyer": buyer_name,
                 "Invoice_No.": invoice_id,
-                "Item": it.get("description", ""),
-                "HSN": it.get("hsn", ""),
-                "Rate%": it.get("rate", 0.0),
-                "Qty": it.get("qty", 0),
-                "UnitPrice": it.get("unit_price", 0.0),
-                "Taxable": float(res["taxable"]),
-                "CGST": float(res["cgst"]),
-                "SGST": float(res["sgst"]),
-                "IGST": float(res["igst"]),
-                "Total": float(res["line_total"])
-            })
+                "Item": gen_items["description"].to_numpy(),
+                "HSN": gen_items["hsn"].to_numpy(),
+                "Rate%": gen_items["rate"].to_numpy(),
+                "Qty": gen_items["qty"].to_numpy(),
+                "UnitPrice": gen_items["unit_price"].to_numpy(),
+                "Taxable": line_amounts["taxable"].to_numpy(),
+                "CGST": line_amounts["cgst"].to_numpy(),
+                "SGST": line_amounts["sgst"].to_numpy(),
+                "IGST": line_amounts["igst"].to_numpy(),
+                "Total": line_amounts["line_total"].to_numpy()
+            }, columns=MERGED_COLUMNS)
+
+bypass_cache = st.checkbox("Re-extract files (ignore cached OCR/PDF results)", value=False)
 
 if uploaded_bulk and st.button("Process Bulk Files"):
-    for up in uploaded_bulk:
-        name = up.name
-        st.info(f"Processing {name} ...")
-        
-        try:
-            file_bytes = up.read()
-            extracted_text = ""
-            detected_fields = {}
-            items_list = []
-            
-            # Step 1: Extract text and detect fields for all file types
-            if name.lower().endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(file_bytes))
-                extracted_text = df.astype(str).to_string(index=False)
-                items_list = ocr_extract_invoice_items(file_bytes, filename=name)
-                
-            elif name.lower().endswith(".xlsx"):
-                df = pd.read_excel(io.BytesIO(file_bytes))
-                extracted_text = df.astype(str).to_string(index=False)
-                items_list = ocr_extract_invoice_items(file_bytes, filename=name)
-                
-            else:  # PDF and Image files
-                # Extract text for field detection
-                extracted_text = extract_text_from_file(file_bytes, name)
-                # Extract items using OCR
-                items_list = ocr_extract_invoice_items(file_bytes, filename=name)
-            
-            # Step 2: Detect Seller, Buyer, Invoice No from extracted text
-            detected_fields = extract_fields_from_text(extracted_text, name)
-            
-            # Display detected fields
-            st.write(f"**Detected from {name}:**")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.write(f"Seller: {detected_fields['seller']}")
-                st.write(f"Buyer: {detected_fields['buyer']}")
-            with col2:
-                st.write(f"Invoice No: {detected_fields['invoice_no']}")
-            
-            # Step 3: Process items
-            if not items_list:
-                st.warning(f"No items found in {name}")
-                continue
-            
-            # Normalize items with HSN lookup
-            normalized_items = normalize_item_dicts(items_list, hsn)
-            
-            for idx, item in enumerate(normalized_items):
-                desc = item.get("Description", "").strip()
-                qty = item.get("qty", 0)
-                unit_price = item.get("unit_price", 0)
-                
-                # Skip empty items
-                if not desc or qty <= 0 or unit_price <= 0:
-                    continue
-                
-                hsn_code = item.get("hsn", "")
-                rate_pct = item.get("rate", 0.0)
-                
-                # Auto-suggest HSN if still missing
-                if not hsn_code and desc:
-                    try:
-                        sugg = hsn.suggest(desc, limit=1)
-                        if sugg:
-                            hsn_code = sugg[0].get("hsn_code", "")
-                            rate_pct = sugg[0].get("rate", 0.0)
-                    except Exception:
-                        pass
-                
-                # Calculate taxes
-                res = compute_line(qty, unit_price, rate_pct, "Maharashtra", "Karnataka")
-                
-                all_records.append({
-                    "SourceFile": name,
-                    "Seller": detected_fields["seller"],
-                    "Buyer": detected_fields["buyer"],
-                    "Invoice_No.": detected_fields["invoice_no"],
-                    "Item": desc,
-                    "HSN": hsn_code,
-                    "Rate%": rate_pct,
-                    "Qty": qty,
-                    "UnitPrice": unit_price,
-                    "Taxable": money(res["taxable"]),
-                    "CGST": money(res["cgst"]),
-                    "SGST": money(res["sgst"]),
-                    "IGST": money(res["igst"]),
-                    "Total": money(res["line_total"])
-                })
-            
-            st.success(f"✅ Successfully processed {len(normalized_items)} items from {name}")
-            
-        except Exception as e:
-            st.error(f"Error processing {name}: {e}")
+    files = [(up.name, up.read()) for up in uploaded_bulk]
+    progress = st.progress(0.0, text=f"Processing {len(files)} files ...")
+    results = process_bulk_files(files, hsn, default_seller=COMPANY_INFO["name"],
+                                 seller_state="Maharashtra", buyer_state="Karnataka",
+                                 use_cache=not bypass_cache, rounding=GST_ROUNDING)
+    record_frames = []
+    for done, result in enumerate(results, start=1):
+        name = result["name"]
+        progress.progress(done / len(files), text=f"Processed {done}/{len(files)}: {name}")
+
+        if result["error"]:
+            st.error(f"Error processing {name}: {result['error']}")
+            continue
+
+        # Display detected fields
+        detected_fields = result["fields"]
+        st.write(f"**Detected from {name}:**")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write(f"Seller: {detected_fields['seller']}")
+            st.write(f"Buyer: {detected_fields['buyer']}")
+        with col2:
+            st.write(f"Invoice No: {detected_fields['invoice_no']}")
+
+        if result["warning"]:
+            st.warning(f"{name}: {result['warning']}")
+
+        if not result["items"]:
+            st.warning(f"No items found in {name}")
+            continue
+
+        if not result["records"].empty:
+            record_frames.append(result["records"])
+        st.success(f"✅ Successfully processed {len(result['items'])} items from {name}")
+    st.session_state.bulk_record_frames = record_frames
 
 # Display and Download Results
-if all_records:
+if not generated_records.empty or record_frames:
     # Convert to DataFrame with proper data types
-    df_all = pd.DataFrame(all_records)
+    frames = ([generated_records] if not generated_records.empty else []) + record_frames
+    df_all = pd.concat(frames, ignore_index=True)
     
     # Ensure numeric columns are properly typed
     numeric_cols = ["Qty", "UnitPrice", "Rate%", "Taxable", "CGST", "SGST", "IGST", "Total"]
@@ -515,7 +404,9 @@ if all_records:
     st.markdown("### 📄 Preview of Merged Data")
     st.dataframe(df_all, use_container_width=True)
     
-    # Summary statistics
+    # Summary statistics (totals per invoice under the same rounding policy as single invoices)
+    df_totals = invoice_totals(df_all, "Maharashtra", "Karnataka", rounding=GST_ROUNDING)
+    invoice_buyers = df_all.groupby("Invoice_No.", sort=False)["Buyer"].first()
     st.markdown("### 📊 Summary")
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -528,7 +419,7 @@ if all_records:
         total_items = len(df_all)
         st.metric("Total Items", total_items)
     with col4:
-        grand_total = df_all['Total'].sum()
+        grand_total = sum_money(df_totals['grand_total'])
         st.metric("Grand Total", f"₹{grand_total:,.2f}")
     
     # Show detected buyers and sellers
@@ -543,67 +434,39 @@ if all_records:
         st.write("**Buyers:**")
         buyers = df_all['Buyer'].unique()
         for buyer in buyers:
-            buyer_total = df_all[df_all['Buyer'] == buyer]['Total'].sum()
+            buyer_total = sum_money(df_totals.loc[invoice_buyers.index[invoice_buyers == buyer], 'grand_total'])
             st.write(f"- {buyer}: ₹{buyer_total:,.2f}")
 
-    # ========== DOWNLOAD OPTIONS ==========
-    # Excel Download
-    out_excel = io.BytesIO()
-    with pd.ExcelWriter(out_excel, engine="openpyxl") as writer:
-        df_all.to_excel(writer, index=False, sheet_name="AllInvoices")
-        
-        # Auto-adjust column widths
-        worksheet = writer.sheets["AllInvoices"]
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    out_excel.seek(0)
-
-    # JSON Download
-    json_records = df_all.to_dict('records')
-    out_json = json.dumps(json_records, indent=4, ensure_ascii=False).encode('utf-8')
+    st.success(f"✅ Successfully processed {len(df_all)} items across {unique_invoices} invoices!")
 
-    # CSV Download
-    out_csv = df_all.to_csv(index=False).encode('utf-8')
-
-    st.success(f"✅ Successfully processed {len(all_records)} items across {unique_invoices} invoices!")
-
-    # Download buttons
+    # ========== DOWNLOAD OPTIONS ==========
+    # Each format is built only when requested and reused until df_all changes
     st.markdown("### 💾 Download Options")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.download_button(
-            label="⬇️ Download as Excel (.xlsx)",
-            data=out_excel,
-            file_name="combined_invoices.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    
-    with col2:
-        st.download_button(
-            label="⬇️ Download as JSON (.json)",
-            data=out_json,
-            file_name="combined_invoices.json",
-            mime="application/json"
-        )
-    
-    with col3:
-        st.download_button(
-            label="⬇️ Download as CSV (.csv)",
-            data=out_csv,
-            file_name="combined_invoices.csv",
-            mime="text/csv"
-        )
+    dataset_fingerprint = dataframe_fingerprint(df_all)
+    for col, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+        label, ext, mime = EXPORT_FORMATS[fmt]
+        with col:
+            lazy_download_button(label, f"bulk_{fmt}", dataset_fingerprint,
+                                 lambda fmt=fmt: build_bulk_export(dataset_fingerprint, fmt, df_all),
+                                 file_name=f"combined_invoices.{ext}", mime=mime)
+
+    # One PDF per invoice, rendered in parallel and zipped
+    if st.button("🧾 Generate Invoice PDFs (.zip)"):
+        pdf_progress = st.progress(0.0, text=f"Rendering {unique_invoices} invoices ...")
+        with tempfile.TemporaryFile() as zip_file:
+            count, failed = render_invoice_pdfs_zip(
+                df_all, zip_file,
+                progress=lambda done, total: pdf_progress.progress(done / total, text=f"Rendered {done}/{total}"),
+                seller_state="Maharashtra", buyer_state="Karnataka", rounding=GST_ROUNDING)
+            for invoice_number, error in failed:
+                st.error(f"Could not render invoice {invoice_number}: {error}")
+            zip_file.seek(0)
+            st.download_button(
+                label=f"⬇️ Download {count} Invoice PDFs (.zip)",
+                data=zip_file.read(),
+                file_name="invoices.zip",
+                mime="application/zip"
+            )
 
 else:
     st.info("📝 No invoice data available. Upload files or generate invoices above.")
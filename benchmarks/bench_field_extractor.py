@@ -0,0 +1,66 @@
+"""Header field extraction time per invoice text: per-call re.search vs precompiled rules.
+
+Usage: python benchmarks/bench_field_extractor.py [texts] [items_per_invoice]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from field_extractor import FIELD_RULES, FieldExtractor # noqa: E402
+
+SELLER_LABELS = ["Seller", "From", "Supplier", "Vendor"]
+BUYER_LABELS = ["Buyer", "Bill To", "Customer", "Client", "Sold To"]
+INVOICE_LABELS = ["Invoice No.", "Inv #", "Invoice", "Bill No"]
+
+def make_text(n, items, rng):
+    seller = rng.choice(SELLER_LABELS)
+    buyer = rng.choice(BUYER_LABELS)
+    invoice = rng.choice(INVOICE_LABELS)
+    header = [
+        "TAX INVOICE",
+        f"{seller}: Acme Traders {n} Pvt Ltd, GSTIN 27ABCDE{n:04d}F1Z5",
+        # two-column header lines, as pdfplumber lays them out
+        f"{buyer}: Buyer {n} Enterprises    {invoice}: INV-{n:05d}",
+        f"Date: 2025-10-{n % 28 + 1:02d}    State: Karnataka",
+    ]
+    body = [f"Widget assorted model {i} {rng.randint(1, 50)} {rng.randint(10, 9999)}.{rng.randint(0, 99):02d}"
+            for i in range(items)]
+    return "\n".join(header + body + ["Grand Total 12,345.00"])
+
+def legacy_match(text):
+    """The original loop: pattern strings re-searched (and re-looked-up) on every call."""
+    found = {}
+    for field, rule, label, value in FIELD_RULES:
+        if field in found:
+            continue
+        m = re.search(f"(?i){label}({value})", text)
+        if m:
+            found[field] = (rule, m.group(1).strip())
+    return found
+
+def bench(fn, texts, rounds=3):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (rounds * len(texts)) * 1e6
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    rng = random.Random(0)
+    texts = [make_text(n, items, rng) for n in range(count)]
+    extractor = FieldExtractor()
+    for text in texts:
+        assert extractor.match(text) == extractor.match_each(text) == legacy_match(text)
+    print(f"{count} invoice texts x {items} item lines")
+    print(f"  re.search per rule (uncompiled) : {bench(legacy_match, texts):.1f} us/text")
+    print(f"  precompiled rules, one by one   : {bench(extractor.match_each, texts):.1f} us/text")
+    print(f"  single combined scan            : {bench(extractor.match, texts):.1f} us/text")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""OCR time and item recall with and without image preprocessing.
+
+Usage: python benchmarks/bench_ocr.py [fixture_dir] [invoices]
+
+fixture_dir holds invoice images (png/jpg) each with a same-named .json file of
+{"items": [{"qty": ..., "unit_price": ...}, ...]}. Without it, phone-photo-like
+fixtures are synthesised: rendered invoices scaled to ~12MP, skewed, unevenly lit
+and placed on a darker background. Needs the tesseract binary on PATH.
+"""
+import glob
+import json
+import os
+import random
+import sys
+import time
+from io import BytesIO
+
+import numpy as np # type: ignore
+import pytesseract # type: ignore
+from PIL import Image # type: ignore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_generator import generate_invoice_image_bytes # noqa: E402
+from ocr import ocr_image, preprocess_for_ocr # noqa: E402
+
+from bench_pdf_template import make_invoice # noqa: E402
+
+def synthetic_photo(invoice, rng):
+    page = Image.open(BytesIO(generate_invoice_image_bytes(invoice, width=1000))).convert("L")
+    page = page.resize((page.width * 3, page.height * 3), Image.Resampling.BICUBIC)
+    page = page.rotate(rng.uniform(-4, 4), resample=Image.Resampling.BICUBIC, expand=True, fillcolor=140)
+    photo = Image.new("L", (4000, 3000), 140)
+    photo.paste(page, (rng.randint(0, 4000 - page.width), rng.randint(0, 3000 - page.height)))
+    # light falling off from left to right, plus sensor noise
+    shade = np.linspace(1.0, 0.75, photo.width)[None, :]
+    noise = np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 6, (photo.height, photo.width))
+    pixels = np.clip(np.asarray(photo, dtype=np.float64) * shade + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).convert("RGB")
+
+def load_fixtures(fixture_dir, count):
+    if fixture_dir:
+        fixtures = []
+        for path in sorted(glob.glob(os.path.join(fixture_dir, "*.*"))):
+            if path.lower().endswith((".png", ".jpg", ".jpeg")):
+                with open(os.path.splitext(path)[0] + ".json", encoding="utf-8") as f:
+                    fixtures.append((Image.open(path), json.load(f)["items"]))
+        return fixtures
+    rng = random.Random(0)
+    fixtures = []
+    for n in range(count):
+        invoice = make_invoice(n, rng.randint(5, 15))
+        for item in invoice["items"]:
+            item["qty"] = rng.randint(1, 40)
+            item["unit_price"] = round(rng.uniform(10, 5000), 2)
+        fixtures.append((synthetic_photo(invoice, rng), invoice["items"]))
+    return fixtures
+
+def recall(text, expected):
+    """Share of expected items whose qty and unit price both appear as tokens on one OCR'd
+    line (scores the OCR, not the item-line regex that later parses it)."""
+    lines = [set(line.replace(",", "").split()) for line in text.splitlines()]
+    hits = sum(any(str(it["qty"]) in tokens and f"{float(it['unit_price']):.2f}" in tokens for tokens in lines)
+               for it in expected)
+    return hits / len(expected)
+
+def run(fixtures, **kwargs):
+    start = time.perf_counter()
+    scores = [recall(ocr_image(img, **kwargs), expected) for img, expected in fixtures]
+    return (time.perf_counter() - start) / len(fixtures), sum(scores) / len(scores)
+
+def main():
+    fixture_dir = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].isdigit() else None
+    count = int(sys.argv[-1]) if sys.argv[-1].isdigit() else 5
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        sys.exit("tesseract is not installed or not on PATH")
+    fixtures = load_fixtures(fixture_dir, count)
+    start = time.perf_counter()
+    for img, _ in fixtures:
+        preprocess_for_ocr(img)
+    prep = (time.perf_counter() - start) / len(fixtures)
+    print(f"{len(fixtures)} fixtures, preprocessing alone {prep * 1000:.0f} ms/image")
+    for label, kwargs in [("raw image, default layout", {"preprocess": False}),
+                          ("preprocessed, page preset", {"preset": "page"}),
+                          ("preprocessed, block preset", {"preset": "block"})]:
+        seconds, score = run(fixtures, **kwargs)
+        print(f"  {label:28s}: {seconds:.2f} s/image, item recall {score:.0%}")
+
+if __name__ == "__main__":
+    main()
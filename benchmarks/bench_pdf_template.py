@@ -0,0 +1,44 @@
+"""Per-invoice PDF render time with and without the precompiled page template.
+
+Usage: python benchmarks/bench_pdf_template.py [invoices] [items_per_invoice]
+"""
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_generator import InvoicePageTemplate, render_invoice_pdf # noqa: E402
+
+def make_invoice(n, items):
+    return {
+        "invoice_number": f"INV-{n:05d}",
+        "date": "2025-10-07",
+        "seller": {"name": "Friends Group Company Pvt. Ltd.", "gstin": "27ABCDE1234F1Z5"},
+        "buyer": {"name": f"Buyer {n}", "state": "Karnataka"},
+        "items": [{"sr": i, "description": f"Item {i}", "hsn": "8471", "qty": 2,
+                   "unit_price": 499.5, "taxable": 999.0, "line_total": 1178.82}
+                  for i in range(1, items + 1)],
+        "totals": {"grand_total": 1178.82 * items},
+    }
+
+def bench(template, invoices):
+    start = time.perf_counter()
+    for inv in invoices:
+        render_invoice_pdf(inv, BytesIO(), template=template)
+    return (time.perf_counter() - start) / len(invoices) * 1000
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    invoices = [make_invoice(n, items) for n in range(count)]
+    bench(InvoicePageTemplate(), invoices[:20])  # warm up fonts/imports
+    direct = bench(InvoicePageTemplate(precompiled=False), invoices)
+    compiled = bench(InvoicePageTemplate(precompiled=True), invoices)
+    print(f"{count} invoices x {items} items")
+    print(f"  static layout drawn per page : {direct:.3f} ms/invoice")
+    print(f"  precompiled page template    : {compiled:.3f} ms/invoice")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import time
+import zipfile
+import argparse
+from datetime import date
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+import pandas as pd # type: ignore
+from tax_calc import DEFAULT_ROUNDING, compute_lines_paise, from_paise # type: ignore
+from invoice_generator import EXPORT_FORMATS, export_dataframe_bytes, generate_invoice_pdf, write_ndjson, write_parquet, write_xlsx
+from utils import OCR_DPI, extract_fields_from_text, extract_invoice, normalize_item_dicts # type: ignore
+
+# File types the pipeline can extract from
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".csv", ".xlsx")
+
+FileSource = Union[bytes, str]
+
+def extract_file(name: str, source: FileSource, default_seller: str = "", use_cache: bool = True,
+                 ocr_dpi: int = OCR_DPI, ocr_workers: int = None) -> Dict:
+    """Text extraction, OCR and field/item detection for one uploaded file.
+
+    source is the file's bytes or a filesystem path, which is then read inside the worker.
+    Scanned PDF pages are OCR'd at ocr_dpi over ocr_workers processes.
+    Runs inside pool workers, so it only returns plain picklable data and never raises:
+    failures are reported through the "error" key. "warning" is set when the file was
+    read but part of it was lost (OCR failed on scanned PDF pages), else None.
+    """
+    try:
+        if isinstance(source, bytes):
+            file_bytes = source
+        else:
+            with open(source, "rb") as f:
+                file_bytes = f.read()
+        doc, items_list = extract_invoice(file_bytes, name, use_cache=use_cache,
+                                          ocr_dpi=ocr_dpi, ocr_workers=ocr_workers)
+        fields = extract_fields_from_text(doc["text"], name, default_seller)
+        warning = "OCR failed on scanned pages; their items are missing" if doc["incomplete"] else None
+        return {"name": name, "fields": fields, "items": items_list, "error": None, "warning": warning}
+    except Exception as e:
+        return {"name": name, "fields": None, "items": [], "error": str(e), "warning": None}
+
+# Column order of the merged bulk dataset
+MERGED_COLUMNS = ["SourceFile", "Seller", "Buyer", "Invoice_No.", "Item", "HSN", "Rate%",
+                  "Qty", "UnitPrice", "Taxable", "CGST", "SGST", "IGST", "Total"]
+
+def records_from_items(name: str, fields: Dict, normalized_items: List[Dict],
+                       seller_state: str, buyer_state: str, rounding: str = DEFAULT_ROUNDING) -> pd.DataFrame:
+    """Compute taxes for normalised items in one vectorised pass; returns merged-dataset rows.
+
+    The items form one invoice; rounding is the GST rounding policy (see tax_calc).
+    """
+    items = pd.DataFrame(normalized_items, columns=["Description", "qty", "unit_price", "hsn", "rate"])
+    items["Description"] = items["Description"].fillna("").astype(str).str.strip()
+    items["qty"] = pd.to_numeric(items["qty"], errors="coerce").fillna(0)
+    items["unit_price"] = pd.to_numeric(items["unit_price"], errors="coerce").fillna(0)
+    # a blank catalog rate stays NaN so compute_lines_paise rejects it instead of billing 0 tax
+    items["rate"] = pd.to_numeric(items["rate"], errors="coerce")
+
+    # Skip empty items
+    items = items[(items["Description"] != "") & (items["qty"] > 0) & (items["unit_price"] > 0)]
+
+    lines, _ = compute_lines_paise(items["qty"], items["unit_price"], items["rate"], seller_state, buyer_state,
+                                   rounding=rounding)
+    return pd.DataFrame({
+        "SourceFile": name,
+        "Seller": fields["seller"],
+        "Buyer": fields["buyer"],
+        "Invoice_No.": fields["invoice_no"],
+        "Item": items["Description"].to_numpy(),
+        "HSN": items["hsn"].fillna("").to_numpy(),
+        "Rate%": items["rate"].to_numpy(),
+        "Qty": items["qty"].to_numpy(),
+        "UnitPrice": items["unit_price"].to_numpy(),
+        "Taxable": from_paise(lines["taxable"].to_numpy()),
+        "CGST": from_paise(lines["cgst"].to_numpy()),
+        "SGST": from_paise(lines["sgst"].to_numpy()),
+        "IGST": from_paise(lines["igst"].to_numpy()),
+        "Total": from_paise(lines["line_total"].to_numpy())
+    }, columns=MERGED_COLUMNS)
+
+def _extracted(files: List[Tuple[str, FileSource]], default_seller: str, workers: int,
+               use_cache: bool, ocr_dpi: int = OCR_DPI) -> Iterator[Dict]:
+    """Yield extract_file() results as they complete, in-process when workers == 1.
+
+    Files run in-process get the workers for OCR of their scanned pages instead; pool
+    workers OCR their pages themselves so the CPUs are not oversubscribed.
+    """
+    if workers == 1 or len(files) == 1:
+        for name, source in files:
+            yield extract_file(name, source, default_seller, use_cache, ocr_dpi, ocr_workers=workers)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(extract_file, name, source, default_seller, use_cache, ocr_dpi, 1): name
+                   for name, source in files}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:  # worker crashed (e.g. BrokenProcessPool)
+                yield {"name": futures[future], "fields": None, "items": [], "error": str(e), "warning": None}
+
+def process_bulk_files(files: Iterable[Tuple[str, FileSource]], hsn_lookup, default_seller: str = "",
+                       seller_state: str = "Maharashtra", buyer_state: str = "Karnataka",
+                       workers: int = None, use_cache: bool = True, ocr_dpi: int = OCR_DPI,
+                       rounding: str = DEFAULT_ROUNDING) -> Iterator[Dict]:
+    """Process (filename, bytes-or-path) pairs across a process pool, streaming per-file results.
+
+    OCR/PDF work fans out to `workers` processes (default: CPU count); HSN matching and
+    tax computation run in the calling process against the shared hsn_lookup. Each
+    yielded dict has name, fields, items (raw extracted), records (a DataFrame of merged
+    rows with MERGED_COLUMNS), error and warning (see extract_file).
+    Extraction results are reused from the on-disk cache unless use_cache is False.
+    Scanned PDF pages are rasterised at ocr_dpi for OCR; rounding is the GST rounding
+    policy (see tax_calc).
+    """
+    files = list(files)
+    workers = workers or os.cpu_count() or 1
+    for result in _extracted(files, default_seller, workers, use_cache, ocr_dpi):
+        result["records"] = pd.DataFrame(columns=MERGED_COLUMNS)
+        if result["error"] is None and result["items"]:
+            try:
+                normalized = normalize_item_dicts(result["items"], hsn_lookup)
+                result["records"] = records_from_items(result["name"], result["fields"], normalized,
+                                                       seller_state, buyer_state, rounding)
+            except Exception as e:
+                result["error"] = str(e)
+        yield result
+
+def invoice_totals(df_all: pd.DataFrame, seller_state: str = "Maharashtra", buyer_state: str = "Karnataka",
+                   rounding: str = DEFAULT_ROUNDING) -> pd.DataFrame:
+    """Per-invoice totals (rupees) of a merged dataset, indexed by Invoice_No.
+
+    All lines are recomputed in one vectorised pass grouped by invoice, so with
+    ROUND_PER_INVOICE the tax is rounded once per invoice exactly as for a single
+    generated invoice, rather than summed from the rounded line columns.
+    """
+    _, totals = compute_lines_paise(df_all["Qty"], df_all["UnitPrice"], df_all["Rate%"], seller_state, buyer_state,
+                                    invoice_ids=df_all["Invoice_No."].to_numpy(), rounding=rounding)
+    return totals / 100
+
+def invoice_dicts_from_frame(df_all: pd.DataFrame, invoice_date: str = None, seller_state: str = "Maharashtra",
+                             buyer_state: str = "Karnataka", rounding: str = DEFAULT_ROUNDING) -> Iterator[Dict]:
+    """Yield one invoice dict (the generate_invoice_pdf shape) per Invoice_No. in a merged dataset.
+
+    Totals follow the rounding policy, see invoice_totals.
+    """
+    invoice_date = invoice_date or date.today().isoformat()
+    totals = invoice_totals(df_all, seller_state, buyer_state, rounding)
+    for invoice_no, rows in df_all.groupby("Invoice_No.", sort=False):
+        first = rows.iloc[0]
+        items = [{
+            "sr": sr,
+            "description": row["Item"],
+            "hsn": row["HSN"],
+            "qty": row["Qty"],
+            "unit_price": row["UnitPrice"],
+            "rate": row["Rate%"],
+            "taxable": row["Taxable"],
+            "cgst": row["CGST"],
+            "sgst": row["SGST"],
+            "igst": row["IGST"],
+            "line_total": row["Total"]
+        } for sr, row in enumerate(rows.to_dict("records"), start=1)]
+        yield {
+            "invoice_number": str(invoice_no),
+            "date": invoice_date,
+            "seller": {"name": first["Seller"], "gstin": ""},
+            "buyer": {"name": first["Buyer"], "gstin": "", "state": ""},
+            "items": items,
+            "totals": {k: float(v) for k, v in totals.loc[invoice_no].items()}
+        }
+
+def _pdf_name(invoice_number: str, used: set) -> str:
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", invoice_number).strip("_") or "invoice"
+    name, n = f"{base}.pdf", 1
+    while name in used:
+        n += 1
+        name = f"{base}_{n}.pdf"
+    used.add(name)
+    return name
+
+def render_invoice_pdfs_zip(df_all: pd.DataFrame, sink, workers: int = None, invoice_date: str = None,
+                            progress=None, seller_state: str = "Maharashtra", buyer_state: str = "Karnataka",
+                            rounding: str = DEFAULT_ROUNDING) -> Tuple[int, List[Tuple[str, str]]]:
+    """Render one PDF per Invoice_No. across a process pool and stream them into a ZIP.
+
+    sink is a path or binary file-like object. At most a few PDFs per worker are in
+    flight at once; each is written to the archive as soon as it is rendered, so memory
+    stays flat regardless of invoice count. progress(done, total) is called per invoice.
+    Invoice totals follow the rounding policy, see invoice_totals.
+    An invoice that fails to render is left out of the archive instead of aborting it.
+    Returns (PDFs written, [(invoice_number, error), ...] for the invoices left out).
+    """
+    workers = workers or os.cpu_count() or 1
+    total = df_all["Invoice_No."].nunique()
+    invoices = invoice_dicts_from_frame(df_all, invoice_date, seller_state, buyer_state, rounding)
+    used, done, failed = set(), 0, []
+    # PDFs are already compressed internally, so store them as-is
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        def finish(invoice_number, render):
+            nonlocal done
+            try:
+                pdf_bytes = render()
+            except Exception as e:  # one bad invoice (or a crashed worker) is reported, not fatal
+                failed.append((invoice_number, str(e)))
+            else:
+                archive.writestr(_pdf_name(invoice_number, used), pdf_bytes)
+            done += 1
+            if progress:
+                progress(done, total)
+
+        if workers == 1:
+            for invoice in invoices:
+                finish(invoice["invoice_number"], lambda: generate_invoice_pdf(invoice))
+            return done - len(failed), failed
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            for invoice in invoices:
+                pending[pool.submit(generate_invoice_pdf, invoice)] = invoice["invoice_number"]
+                if len(pending) >= workers * 4:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(pending.pop(future), future.result)
+            for future in as_completed(pending):
+                finish(pending[future], future.result)
+    return done - len(failed), failed
+
+def find_invoice_files(input_dir: str) -> List[Tuple[str, str]]:
+    """(relative name, absolute path) for every supported file under input_dir, sorted."""
+    found = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                path = os.path.join(root, name)
+                found.append((os.path.relpath(path, input_dir), os.path.abspath(path)))
+    return sorted(found)
+
+def _output_format(path: str) -> str:
+    fmt = os.path.splitext(path)[1].lower().lstrip(".")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported output format '.{fmt}' (choose from {', '.join(EXPORT_FORMATS)})")
+    return fmt
+
+def write_output(df: pd.DataFrame, path: str) -> None:
+    """Write the merged dataset to path; the format follows the extension (see EXPORT_FORMATS)."""
+    fmt = _output_format(path)
+    if fmt == "xlsx":
+        write_xlsx({"AllInvoices": df}, path)
+    elif fmt == "parquet":
+        write_parquet(df, path)
+    elif fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "ndjson":
+        with open(path, "wb") as f:
+            write_ndjson(df, f)
+    else:
+        with open(path, "wb") as f:
+            f.write(export_dataframe_bytes(df, fmt))
+
+def run_bulk(args) -> int:
+    from hsn_lookup import HSNLookup
+
+    files = find_invoice_files(args.input_dir)
+    if not files:
+        print(f"No {'/'.join(SUPPORTED_EXTENSIONS)} files found under {args.input_dir}", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    hsn_lookup = HSNLookup.load_cached(args.hsn_csv, snapshot=True)
+    frames, items, failed, warned = [], 0, 0, 0
+    results = process_bulk_files(files, hsn_lookup, default_seller=args.seller,
+                                 seller_state=args.seller_state, buyer_state=args.buyer_state,
+                                 workers=args.workers, use_cache=not args.no_cache, ocr_dpi=args.ocr_dpi)
+    for done, result in enumerate(results, start=1):
+        if result["error"]:
+            failed += 1
+            status = f"ERROR {result['error']}"
+        else:
+            rows = len(result["records"])
+            items += rows
+            if rows:
+                frames.append(result["records"])
+            status = f"{rows} items"
+            if result["warning"]:
+                warned += 1
+                status += f" (WARNING {result['warning']})"
+        if not args.quiet:
+            print(f"[{done}/{len(files)}] {result['name']}: {status}", file=sys.stderr)
+
+    df_all = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=MERGED_COLUMNS)
+    write_output(df_all, args.output)
+    elapsed = time.perf_counter() - started
+    print(f"Processed {len(files)} files ({failed} failed, {warned} with warnings), {items} items, "
+          f"{df_all['Invoice_No.'].nunique()} invoices in {elapsed:.1f}s "
+          f"({len(files) / elapsed:.1f} files/s, {items / elapsed:.1f} items/s) -> {args.output}",
+          file=sys.stderr)
+    return 1 if failed == len(files) else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bulk_processor",
+                                     description="Headless GST invoice bulk processing.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bulk = commands.add_parser("bulk", help="extract, match HSN and compute GST for a directory of invoices")
+    bulk.add_argument("input_dir", help="directory searched recursively for PDF/image/CSV/XLSX invoices")
+    bulk.add_argument("-o", "--output", required=True,
+                      help=f"merged output file ({', '.join('.' + f for f in EXPORT_FORMATS)})")
+    bulk.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    bulk.add_argument("--hsn-csv", default="Data/HSN DATA 400.csv", help="HSN master CSV")
+    bulk.add_argument("--seller", default="", help="seller name used when none is detected")
+    bulk.add_argument("--seller-state", default="Maharashtra")
+    bulk.add_argument("--buyer-state", default="Karnataka")
+    bulk.add_argument("--ocr-dpi", type=int, default=OCR_DPI,
+                      help=f"resolution scanned PDF pages are OCR'd at (default: {OCR_DPI})")
+    bulk.add_argument("--no-cache", action="store_true", help="re-extract every file, refreshing its extraction cache entry")
+    bulk.add_argument("-q", "--quiet", action="store_true", help="only print the final summary")
+    args = parser.parse_args(argv)
+    try:
+        _output_format(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "bulk":
+        return run_bulk(args)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
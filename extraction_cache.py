@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = os.environ.get("GST_INVOICE_CACHE_DIR", os.path.join(".cache", "extraction"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Puts between full scans of the cache directory; in between, each process adds the
+# sizes it writes to the last scanned total
+RESCAN_EVERY = 100
+
+class ExtractionCache:
+    """Disk cache of extraction results keyed by SHA-256 of file bytes plus extractor settings.
+
+    Entries are JSON files written atomically, so pool workers can share one directory.
+    When the directory grows past max_bytes the least recently used entries are evicted.
+    The directory is only walked every rescan_every puts (or when the running size
+    estimate passes max_bytes), not on every put.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 rescan_every: int = RESCAN_EVERY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        self._lock = threading.Lock()
+        self._total = None  # bytes at the last scan plus bytes written since
+        self._puts = 0
+
+    @staticmethod
+    def key(file_bytes: bytes, settings: dict) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        h.update(b"\0")
+        h.update(file_bytes)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used for eviction
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except (OSError, TypeError, ValueError):
+            # caching is best effort; never fail an extraction because of it
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._puts += 1
+            if self._total is not None and self._puts % self.rescan_every:
+                self._total += size
+                if self._total <= self.max_bytes:
+                    return
+            self._evict()
+
+    def _evict(self) -> None:
+        """Walk the cache, drop least recently used entries past max_bytes (lock held)."""
+        entries, total = [], 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+        if total > self.max_bytes:
+            for _, size, full in sorted(entries):
+                try:
+                    os.remove(full)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self._total = total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._total = None
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                try:
+                    os.remove(os.path.join(root, name))
+                except OSError:
+                    pass
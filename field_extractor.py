@@ -0,0 +1,101 @@
+import re
+from typing import Dict, List, Tuple
+
+# (field, rule, label, value), highest priority first within each field. Both parts are
+# written in lower case: the combined scan runs over text.lower(), which keeps sre's
+# literal/charset prefix scan that IGNORECASE switches off (with IGNORECASE a single
+# alternation pass is several times slower than searching each rule separately).
+FIELD_RULES: List[Tuple[str, str, str, str]] = [
+    ("seller", "seller", r"seller\s*[:\-]\s*", r"[^\n\r]+"),
+    ("seller", "from", r"from\s*[:\-]\s*", r"[^\n\r]+"),
+    ("seller", "supplier", r"supplier\s*[:\-]\s*", r"[^\n\r]+"),
+    ("seller", "vendor", r"vendor\s*[:\-]\s*", r"[^\n\r]+"),
+    ("buyer", "buyer", r"buyer\s*[:\-]\s*", r"[^\n\r]+"),
+    ("buyer", "bill_to", r"bill\s*to\s*[:\-]\s*", r"[^\n\r]+"),
+    ("buyer", "customer", r"customer\s*[:\-]\s*", r"[^\n\r]+"),
+    ("buyer", "client", r"client\s*[:\-]\s*", r"[^\n\r]+"),
+    ("buyer", "sold_to", r"sold\s*to\s*[:\-]\s*", r"[^\n\r]+"),
+    ("invoice_no", "invoice_no", r"invoice\s*no\.?\s*[:\-]\s*", r"[a-z0-9\-_/]+"),
+    ("invoice_no", "inv", r"inv\s*#?\s*[:\-]\s*", r"[a-z0-9\-_/]+"),
+    ("invoice_no", "invoice", r"invoice\s*[:\-]\s*", r"[a-z0-9\-_/]+"),
+    ("invoice_no", "bill_no", r"bill\s*no\.?\s*[:\-]\s*", r"[a-z0-9\-_/]+"),
+]
+
+class FieldExtractor:
+    """Finds invoice header fields with one combined regex pass over the text.
+
+    For each field the highest-priority rule that matches anywhere wins, the same
+    result as searching that field's rules one after another, provided no label can
+    begin part-way through another label (labels may share a start, e.g. "inv" and
+    "invoice"). match() returns {field: (rule, value)} so callers can report which
+    rule fired.
+    """
+
+    def __init__(self, rules: List[Tuple[str, str, str, str]] = FIELD_RULES):
+        self.rules = list(rules)
+        names = [f"{field}__{rule}" for field, rule, _, _ in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique within a field")
+        # values are captured inside a lookahead so the scan only consumes labels and
+        # a label sitting in another field's value (same line) is still seen
+        self._rules = [re.compile(f"{label}(?=({value}))", re.IGNORECASE) for _, _, label, value in self.rules]
+        # only the value is a (named) group: a group opening each branch would hide the
+        # branches' leading literals from sre and disable the prefix scan
+        self._scan = re.compile("|".join(f"{label}(?=(?P<{name}>{value}))"
+                                         for name, (_, _, label, value) in zip(names, self.rules)))
+        self._rule_of = {name: i for i, name in enumerate(names)}
+        self._by_field: Dict[str, List[int]] = {}
+        for i, (field, _, _, _) in enumerate(self.rules):
+            self._by_field.setdefault(field, []).append(i)
+
+    def match(self, text: str) -> Dict[str, Tuple[str, str]]:
+        if not text:
+            return {}
+        low = text.lower()
+        if len(low) != len(text):
+            # a few non-ASCII characters change length when lower-cased, so offsets
+            # into low would not line up with text
+            return self.match_each(text)
+        best, starts = {}, []
+        for m in self._scan.finditer(low):
+            i = self._rule_of[m.lastgroup]
+            starts.append(m.start())
+            field = self.rules[i][0]
+            if field not in best or i < best[field][0]:
+                best[field] = (i, m.start(), m.span(m.lastgroup))
+        # when several labels match at one position the scan keeps only the first
+        # alternative; re-check those positions for better rules of each field and for
+        # earlier hits of the winning rule
+        for field, ids in self._by_field.items():
+            top, found_at, _ = best.get(field, (None, len(low), None))
+            for i in ids:
+                span = self._match_at(self._rules[i], low, starts, found_at if i == top else len(low))
+                if span:
+                    best[field] = (i, None, span)
+                    break
+                if i == top:
+                    break
+        return {field: (self.rules[i][1], text[s:e].strip()) for field, (i, _, (s, e)) in best.items()}
+
+    @staticmethod
+    def _match_at(rx, low, starts, stop):
+        for pos in starts:
+            if pos >= stop:
+                break
+            m = rx.match(low, pos)
+            if m:
+                return m.span(1)
+        return None
+
+    def match_each(self, text: str) -> Dict[str, Tuple[str, str]]:
+        """Reference implementation: search each field's rules in priority order."""
+        found = {}
+        for field, ids in self._by_field.items():
+            for i in ids:
+                m = self._rules[i].search(text)
+                if m:
+                    found[field] = (self.rules[i][1], m.group(1).strip())
+                    break
+        return found
+
+DEFAULT_EXTRACTOR = FieldExtractor()
@@ -1,31 +1,397 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np # type: ignore
 import pandas as pd # type: ignore
 from rapidfuzz import process, fuzz # type: ignore
+from rapidfuzz.utils import default_process # type: ignore
+
+# Process-wide cache of loaded lookups: (abspath, constructor kwargs) -> (mtime, HSNLookup)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+# Bump when the snapshot layout or string preprocessing changes
+SNAPSHOT_VERSION = 5
+_CODE_TABLES = ("code", "heading", "chapter")
+# Files of the earlier fixed-width .npy layout, removed when a snapshot is rewritten
+_STALE_SNAPSHOT_FILES = ("descriptions.npy", "processed.npy", "codes.npy")
+
+# Queries scored per cdist call; bounds the score matrix to chunk x catalog floats
+_CDIST_CHUNK = 512
+
+# Tokens found in more than this share of rows ("of", "and", "other" ...) are not
+# indexed: they narrow nothing. Small catalogs index tokens up to _MIN_POSTING_CUTOFF rows.
+_MAX_POSTING_SHARE = 0.05
+_MIN_POSTING_CUTOFF = 64
+# Candidate sets larger than this are scored with the batched, multi-core full scan
+_MAX_CANDIDATES = 2048
+
+def _normalize(description) -> str:
+    """Fold case, punctuation and whitespace so equivalent descriptions share a memo key."""
+    return " ".join(default_process(str(description)).split())
+
+def normalize_hsn_code(code) -> str:
+    """Canonical digit string for an HSN code ("8471.30", 847130.0, " 0401 " ...).
+
+    Codes read as numbers lose leading zeros, so odd-length results are left-padded.
+    A fractional number (0902.10 read as 902.1) has lost digits for good and gives "".
+    """
+    if code is None:
+        return ""
+    if isinstance(code, (float, np.floating)):
+        if not float(code).is_integer():
+            return ""
+        code = int(code)
+    digits = "".join(ch for ch in str(code) if ch.isdigit())
+    if len(digits) % 2:
+        digits = "0" + digits
+    return digits
 
 class HSNLookup:
-    def __init__(self, csv_path: str):
-        """Load HSN code dataset (CSV must have columns: hsn_code, Description, rate)."""
-        self.df = pd.read_csv(csv_path)
+    def __init__(self, csv_path: str, memo_size: int = 4096, snapshot: bool = False):
+        """Load HSN code dataset (CSV must have columns: hsn_code, Description, rate).
+
+        With snapshot=True the preprocessed catalog and its token/code indexes are
+        loaded from `<csv_path>.snapshot/`, which is (re)compiled whenever the CSV is
+        newer, instead of being parsed and indexed again.
+        """
+        self.csv_path = csv_path
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.df = None
+        loaded = self._load_snapshot(csv_path) if snapshot else None
+        if loaded is None:
+            self.df = self._read_csv(csv_path)
+            columns = self._columns_from_df(self.df)
+            index = self._index_columns(columns)
+            if snapshot:
+                self._write_snapshot(csv_path, columns, index)
+        else:
+            columns, index = loaded
+        self._build_index(columns, index)
+
+    @staticmethod
+    def _read_csv(csv_path):
+        # HSN codes are read as text so "0902.10" keeps its zeros
+        header = pd.read_csv(csv_path, nrows=0).columns
+        df = pd.read_csv(csv_path, dtype={c: str for c in header if c.lower() in ("hsn", "hsn_code")})
         # normalize columns (case-insensitive)
-        self.df.columns = [c.lower() for c in self.df.columns]
-        if "hsn" in self.df.columns and "hsn_code" not in self.df.columns:
-            self.df.rename(columns={"hsn": "hsn_code"}, inplace=True)
-        if "description" not in self.df.columns:
+        df.columns = [c.lower() for c in df.columns]
+        if "hsn" in df.columns and "hsn_code" not in df.columns:
+            df.rename(columns={"hsn": "hsn_code"}, inplace=True)
+        if "description" not in df.columns:
             raise ValueError("CSV must have a Description column")
-        if "rate" not in self.df.columns:
+        if "rate" not in df.columns:
             raise ValueError("CSV must have a Rate column")
+        return df
+
+    @staticmethod
+    def _columns_from_df(df):
+        descriptions = df['description'].astype(str).tolist()
+        return {
+            "descriptions": descriptions,
+            "processed": [_normalize(d) for d in descriptions],
+            "codes": [normalize_hsn_code(c) for c in df['hsn_code'].tolist()],
+            "rates": df['rate'].tolist(),
+        }
+
+    @staticmethod
+    def snapshot_dir(csv_path: str) -> str:
+        return csv_path + ".snapshot"
+
+    @classmethod
+    def compile_snapshot(cls, csv_path: str):
+        """Parse csv_path and write its snapshot; returns the snapshot directory."""
+        columns = cls._columns_from_df(cls._read_csv(csv_path))
+        cls._write_snapshot(csv_path, columns, cls._index_columns(columns))
+        return cls.snapshot_dir(csv_path)
+
+    @classmethod
+    def _write_snapshot(cls, csv_path, columns, index):
+        """Best-effort write of the catalog and its indexes plus a meta.json written last.
+
+        Text columns are stored NUL-separated in one UTF-8 file each (no fixed-width
+        padding, and read back with a single decode), rates and token postings as .npy
+        and the code tables as JSON. Every file goes through a per-process temp name
+        and os.replace, so workers compiling the same snapshot at once never see each
+        other's partial writes.
+        """
+        out = cls.snapshot_dir(csv_path)
+        pid = os.getpid()
+
+        def replace(name, data):
+            tmp = os.path.join(out, f".{name}.{pid}.tmp")
+            with open(tmp, "wb") as f:
+                if isinstance(data, np.ndarray):
+                    np.save(f, data)
+                else:
+                    f.write(data)
+            os.replace(tmp, os.path.join(out, name))
+
+        try:
+            tokens = list(index["tokens"])
+            postings = [index["tokens"][t] for t in tokens]
+            texts = {"descriptions": columns["descriptions"], "processed": columns["processed"],
+                     "codes": columns["codes"], "tokens": tokens}
+            blobs = {}
+            for name, values in texts.items():
+                blob = "\0".join(values)
+                if blob.count("\0") != max(len(values) - 1, 0):
+                    raise ValueError("NUL in catalog text")
+                blobs[name] = blob.encode("utf-8")
+            rates = np.asarray(columns["rates"], dtype=np.float64)
+            os.makedirs(out, exist_ok=True)
+            for name, blob in blobs.items():
+                replace(f"{name}.txt", blob)
+            replace("rates.npy", rates)
+            replace("postings.npy", np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32))
+            replace("posting_offsets.npy", np.cumsum([0] + [len(p) for p in postings], dtype=np.int64))
+            replace("code_index.json", json.dumps({k: index[k] for k in _CODE_TABLES}).encode("utf-8"))
+            meta = {"version": SNAPSHOT_VERSION, "source_mtime": os.path.getmtime(csv_path),
+                    "counts": {name: len(values) for name, values in texts.items()}}
+            replace("meta.json", json.dumps(meta).encode("utf-8"))
+            for name in _STALE_SNAPSHOT_FILES:
+                if os.path.exists(os.path.join(out, name)):
+                    os.remove(os.path.join(out, name))
+        except (OSError, ValueError, TypeError):
+            # non-numeric rates or a read-only data dir: stay on the CSV path
+            pass
+
+    @classmethod
+    def _load_snapshot(cls, csv_path):
+        """(columns, index) from a snapshot that is current for csv_path, else None."""
+        src = cls.snapshot_dir(csv_path)
+        try:
+            with open(os.path.join(src, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != SNAPSHOT_VERSION:
+                return None
+            if meta.get("source_mtime", 0) < os.path.getmtime(csv_path):
+                return None
+            texts = {}
+            for name, count in meta["counts"].items():
+                with open(os.path.join(src, f"{name}.txt"), "rb") as f:
+                    values = f.read().decode("utf-8").split("\0") if count else []
+                if len(values) != count:
+                    return None
+                texts[name] = values
+            rates = np.load(os.path.join(src, "rates.npy")).tolist()
+            postings = np.load(os.path.join(src, "postings.npy"))
+            offsets = np.load(os.path.join(src, "posting_offsets.npy"))
+            with open(os.path.join(src, "code_index.json"), encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError, KeyError):
+            return None
+        index["tokens"] = dict(zip(texts.pop("tokens"), np.split(postings, offsets[1:-1])))
+        return {**texts, "rates": rates}, index
+
+    @staticmethod
+    def _index_columns(columns):
+        """Token and code indexes of a catalog (persisted in snapshots).
+
+        "tokens" maps each token to the rows containing it, leaving out tokens too
+        common to narrow a search (see _MAX_POSTING_SHARE). "code", "heading" and
+        "chapter" map a full code / 4-digit heading / 2-digit chapter to a row; a row
+        whose code *is* the heading or chapter wins over the first row merely under it.
+        """
+        postings = {}
+        for idx, text in enumerate(columns["processed"]):
+            for token in set(text.split()):
+                if len(token) > 1:
+                    postings.setdefault(token, []).append(idx)
+        cutoff = max(_MIN_POSTING_CUTOFF, int(_MAX_POSTING_SHARE * len(columns["processed"])))
+        postings = {t: rows for t, rows in postings.items() if len(rows) <= cutoff}
+        by_code, by_heading, by_chapter = {}, {}, {}
+        for idx, code in enumerate(columns["codes"]):
+            if not code:
+                continue
+            by_code.setdefault(code, idx)
+            for prefix_len, table in ((4, by_heading), (2, by_chapter)):
+                if len(code) == prefix_len:
+                    table[code] = idx
+                elif len(code) > prefix_len:
+                    table.setdefault(code[:prefix_len], idx)
+        return {"tokens": {t: np.asarray(rows, dtype=np.int32) for t, rows in postings.items()},
+                "code": by_code, "heading": by_heading, "chapter": by_chapter}
+
+    def _build_index(self, columns, index):
+        """Keep parallel columnar lists so suggest() never touches the DataFrame."""
+        self._descriptions = columns["descriptions"]
+        self._processed = columns["processed"]
+        self._codes = columns["codes"]
+        self._rates = columns["rates"]
+        # exact normalised description -> first row (filled in reverse so the first wins)
+        self._exact = dict(zip(reversed(self._processed), range(len(self._processed) - 1, -1, -1)))
+        self._token_index = index["tokens"]
+        self._by_code, self._by_heading, self._by_chapter = (index[k] for k in _CODE_TABLES)
+        self.clear_memo()
+
+    def _candidates(self, query):
+        """Rows sharing at least one indexed token with query, or None if there are none
+        or more than _MAX_CANDIDATES (a full scan is then as cheap and batches better)."""
+        rows = [self._token_index[t] for t in set(query.split()) if t in self._token_index]
+        if not rows:
+            return None
+        candidates = np.unique(np.concatenate(rows))
+        return candidates if len(candidates) <= _MAX_CANDIDATES else None
+
+    def _match(self, query, limit):
+        """Resolve one normalised query via exact hit, token candidates, then full scan."""
+        if limit == 1 and query in self._exact:
+            return [self._result(self._exact[query], 100.0, "exact")]
+        candidates = self._candidates(query)
+        if candidates is None:
+            matches = process.extract(query, self._processed, scorer=fuzz.WRatio,
+                                      processor=None, limit=limit)
+            return [self._result(idx, score, "full") for _, score, idx in matches]
+        return self._match_candidates(query, candidates, limit)
+
+    def _match_candidates(self, query, candidates, limit):
+        """Fuzzy-score query against the candidate rows only."""
+        subset = [self._processed[i] for i in candidates]
+        matches = process.extract(query, subset, scorer=fuzz.WRatio,
+                                  processor=None, limit=limit)
+        return [self._result(int(candidates[pos]), score, "token") for _, score, pos in matches]
+
+    def clear_memo(self):
+        """Drop memoised suggestions and reset hit/miss counters."""
+        with self._memo_lock:
+            self._memo.clear()
+            self.memo_hits = 0
+            self.memo_misses = 0
+
+    def memo_info(self):
+        """Return memo statistics (hits, misses, current size, max size)."""
+        return {"hits": self.memo_hits, "misses": self.memo_misses,
+                "size": len(self._memo), "max_size": self.memo_size}
+
+    def _memo_get(self, key):
+        with self._memo_lock:
+            hit = self._memo.get(key)
+            if hit is None:
+                self.memo_misses += 1
+                return None
+            self._memo.move_to_end(key)
+            self.memo_hits += 1
+            return [dict(r) for r in hit]
+
+    def _memo_put(self, key, results):
+        if self.memo_size <= 0:
+            return
+        with self._memo_lock:
+            self._memo[key] = results
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    @classmethod
+    def load_cached(cls, csv_path: str, **kwargs):
+        """Return a shared HSNLookup for csv_path, reloading only when the file's mtime changes.
+
+        Instances are shared per distinct kwargs (snapshot, memo_size), so callers asking
+        for different settings never get each other's lookup.
+        """
+        path = os.path.abspath(csv_path)
+        key = (path, tuple(sorted(kwargs.items())))
+        mtime = os.path.getmtime(path)
+        with _CACHE_LOCK:
+            cached = _CACHE.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            lookup = cls(csv_path, **kwargs)
+            _CACHE[key] = (mtime, lookup)
+            return lookup
+
+    def lookup_code(self, code):
+        """Resolve an HSN code directly, falling back to its heading then chapter.
+
+        Returns a suggest()-shaped result whose "match" is "code", "heading" or
+        "chapter", or None when nothing in the catalog shares the code's chapter.
+        """
+        code = normalize_hsn_code(code)
+        if len(code) < 2:
+            return None
+        if code in self._by_code:
+            return self._result(self._by_code[code], 100.0, "code")
+        if len(code) >= 4 and code[:4] in self._by_heading:
+            return self._result(self._by_heading[code[:4]], 100.0, "heading")
+        if code[:2] in self._by_chapter:
+            return self._result(self._by_chapter[code[:2]], 100.0, "chapter")
+        return None
+
+    def rate_for_code(self, code, default=None):
+        """GST rate for an HSN code (see lookup_code), or default if unknown."""
+        hit = self.lookup_code(code)
+        return hit["rate"] if hit else default
 
     def suggest(self, description: str, limit: int = 1):
-        """Suggest closest HSN codes for an item description."""
-        choices = self.df['description'].tolist()
-        matches = process.extract(description, choices, scorer=fuzz.WRatio, limit=limit)
-        results = []
-        for match, score, idx in matches:
-            row = self.df.iloc[idx]
-            results.append({
-                "hsn_code": row['hsn_code'],
-                "Description": row['description'],
-                "rate": row['rate'],
-                "score": score
-            })
-        return results
+        """Suggest closest HSN codes for an item description.
+
+        Each result carries a "match" key naming the path that produced it:
+        "exact", "token" (fuzzy over rows sharing a token) or "full" (fuzzy over all rows).
+        """
+        query = _normalize(description)
+        cached = self._memo_get((query, limit))
+        if cached is not None:
+            return cached
+        results = self._match(query, limit)
+        self._memo_put((query, limit), results)
+        return [dict(r) for r in results]
+
+    def suggest_many(self, descriptions, limit: int = 1, workers: int = -1):
+        """Suggest HSN codes for a batch of descriptions in one vectorised pass.
+
+        Exact and token-candidate hits are resolved as in suggest(); queries sharing no
+        indexed token with the catalog, or matching too many rows through their tokens,
+        are scored together with rapidfuzz's cdist across `workers` cores (-1 = all).
+        Returns one result list per description.
+        """
+        queries = [_normalize(d) for d in descriptions]
+        if not queries or len(self._processed) == 0:
+            return [[] for _ in queries]
+        limit = min(limit, len(self._processed))
+        found = {}
+        pending = {}  # ordered set: repeated queries are scored once
+        for q in queries:
+            if q in found or q in pending:
+                continue
+            cached = self._memo_get((q, limit))
+            if cached is not None:
+                found[q] = cached
+            elif limit == 1 and q in self._exact:
+                found[q] = self._match(q, limit)
+                self._memo_put((q, limit), found[q])
+            else:
+                candidates = self._candidates(q)
+                if candidates is None:
+                    pending[q] = None
+                    continue
+                found[q] = self._match_candidates(q, candidates, limit)
+                self._memo_put((q, limit), found[q])
+        pending = list(pending)
+        for start in range(0, len(pending), _CDIST_CHUNK):
+            chunk = pending[start:start + _CDIST_CHUNK]
+            scores = process.cdist(chunk, self._processed, scorer=fuzz.WRatio,
+                                   processor=None, dtype=np.float32, workers=workers)
+            if limit == 1:
+                top = scores.argmax(axis=1)[:, None]
+            else:
+                top = np.argsort(-scores, axis=1, kind="stable")[:, :limit]
+            for row, idxs in enumerate(top):
+                results = [self._result(int(i), float(scores[row, i]), "full") for i in idxs]
+                self._memo_put((chunk[row], limit), results)
+                found[chunk[row]] = results
+        return [[dict(r) for r in found[q]] for q in queries]
 
+    def _result(self, idx, score, match):
+        return {
+            "hsn_code": str(self._codes[idx]),
+            "Description": str(self._descriptions[idx]),
+            "rate": float(self._rates[idx]),
+            "score": score,
+            "match": match
+        }
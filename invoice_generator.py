@@ -1,111 +1,246 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from io import BytesIO
+import hashlib
+import importlib.util
+import json
 import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
+from openpyxl import Workbook # type: ignore
+from openpyxl.cell import WriteOnlyCell # type: ignore
+from openpyxl.styles import Font # type: ignore
+from openpyxl.utils import get_column_letter # type: ignore
+from tax_calc import to_paise, from_paise
 
-def generate_invoice_pdf(invoice_dict):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    
-    # Set initial coordinates
-    x, y = 40, height - 40
-    
-    # Header Section
-    c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width/2, y, "TAX INVOICE")
-    y -= 30
-    
-    # Invoice Details
-    c.setFont("Helvetica", 10)
-    c.drawString(x, y, f"Invoice: {invoice_dict['invoice_number']}")
-    c.drawString(width/2, y, f"Date: {invoice_dict['date']}")
-    y -= 20
-    
-    # Seller Information
-    c.drawString(x, y, f"Seller: {invoice_dict['seller']['name']}")
-    c.drawString(width/2, y, f"GSTIN: {invoice_dict['seller'].get('gstin', '')}")
-    y -= 20
-    
-    # Buyer Information
-    c.drawString(x, y, f"Buyer: {invoice_dict['buyer'].get('name', '')}")
-    c.drawString(width/2, y, f"State: {invoice_dict['buyer'].get('state', '')}")
-    y -= 30
-    
-    # Table Header
-    c.setFont("Helvetica-Bold", 10)
-    headers = ["Sr", "Description", "HSN", "Qty", "Unit", "Taxable"]
-    positions = [x, x+80, x+280, x+340, x+380, x+440]
+_XLSX_HEADER_FONT = Font(bold=True)
+
+# Item table layout: column x-offsets from the left margin, row pitch and the
+# y position below which a new page is started
+_TABLE_HEADERS = ["Sr", "Description", "HSN", "Qty", "Unit", "Taxable"]
+_TABLE_OFFSETS = [0, 80, 280, 340, 380, 440]
+_ROW_HEIGHT = 15
+_PAGE_BOTTOM = 100
+
+class InvoicePageTemplate:
+    """Static invoice layout (title, field labels, table headings) compiled once.
+
+    At construction the static parts are rendered on a scratch canvas into PDF text
+    operators, grouped by font. Each invoice then stamps those cached fragments with
+    setFont + addLiteral and only draws its field values and item rows. With
+    precompiled=False the static parts are drawn with drawString on every page instead
+    (the pre-template behaviour, kept for benchmarking).
+    """
+
+    def __init__(self, pagesize=A4, margin=40, precompiled=True):
+        self.pagesize = pagesize
+        self.precompiled = precompiled
+        width, height = pagesize
+        self.width, self.height = width, height
+        x, top, mid = margin, height - margin, width / 2
+        self.top = top
+        # (label, value key, x, y); values are drawn right after their label
+        self.fields = [
+            ("Invoice: ", "invoice_number", x, top - 30),
+            ("Date: ", "date", mid, top - 30),
+            ("Seller: ", "seller_name", x, top - 50),
+            ("GSTIN: ", "seller_gstin", mid, top - 50),
+            ("Buyer: ", "buyer_name", x, top - 70),
+            ("State: ", "buyer_state", mid, top - 70),
+        ]
+        self.value_x = [fx + stringWidth(label, "Helvetica", 10) for label, _, fx, _ in self.fields]
+        self.positions = [x + offset for offset in _TABLE_OFFSETS]
+        self.table_top = top - 100
+        self.rows_top = self.table_top - 20
+        self.continuation_rows_top = top - 20
+        self._first_page = self._compile(self._first_page_strings())
+        self._continuation = self._compile(self._table_header_strings(self.top))
+
+    def _table_header_strings(self, y):
+        return [("Helvetica-Bold", 10, pos, y, header)
+                for header, pos in zip(_TABLE_HEADERS, self.positions)]
+
+    def _first_page_strings(self):
+        title = "TAX INVOICE"
+        title_x = self.width / 2 - stringWidth(title, "Helvetica-Bold", 14) / 2
+        return ([("Helvetica-Bold", 14, title_x, self.top, title)]
+                + [("Helvetica", 10, fx, fy, label) for label, _, fx, fy in self.fields]
+                + self._table_header_strings(self.table_top))
+
+    def _compile(self, strings):
+        """[(font, size, x, y, text)] -> [(font, size, strings, PDF text operators)] per font run."""
+        scratch = canvas.Canvas(BytesIO(), pagesize=self.pagesize)
+        runs = []
+        for font, size, tx, ty, text in strings:
+            if not runs or runs[-1][:2] != (font, size):
+                runs.append((font, size, []))
+            runs[-1][2].append((tx, ty, text))
+        compiled = []
+        for font, size, run in runs:
+            scratch.setFont(font, size)
+            text_obj = scratch.beginText()
+            for tx, ty, text in run:
+                text_obj.setTextOrigin(tx, ty)
+                text_obj.textOut(text)
+            compiled.append((font, size, run, text_obj.getCode()))
+        return compiled
+
+    def _stamp(self, c, compiled):
+        for font, size, run, code in compiled:
+            c.setFont(font, size)
+            if self.precompiled:
+                c.addLiteral(code)
+            else:
+                for tx, ty, text in run:
+                    c.drawString(tx, ty, text)
+
+    def begin(self, c, values):
+        """Stamp the first page's static layout and draw the invoice's field values."""
+        self._stamp(c, self._first_page)
+        text = c.beginText()
+        text.setFont("Helvetica", 10)
+        for (_, key, _, fy), vx in zip(self.fields, self.value_x):
+            text.setTextOrigin(vx, fy)
+            text.textLine(str(values[key]))
+        c.drawText(text)
+
+    def continue_page(self, c):
+        """Stamp the repeated table heading on a continuation page."""
+        self._stamp(c, self._continuation)
+
+DEFAULT_TEMPLATE = InvoicePageTemplate()
+
+def _begin_rows(c):
+    """One text object per page for all item cells (one BT/ET block instead of one per cell)."""
+    text = c.beginText()
+    text.setFont("Helvetica", 9)
+    return text
+
+def render_invoice_pdf(invoice_dict, sink, items=None, page_compression=1, template=None):
+    """Render an invoice PDF into sink (a path or binary file-like object).
+
+    items may be any iterable, e.g. a generator, and is consumed one row at a time;
+    it defaults to invoice_dict['items']. The table header is repeated on every page.
+    If invoice_dict has no 'totals', the grand total is accumulated from each
+    item's line_total while rendering. template defaults to DEFAULT_TEMPLATE.
+    """
+    items = invoice_dict['items'] if items is None else items
+    template = template or DEFAULT_TEMPLATE
+    c = canvas.Canvas(sink, pagesize=template.pagesize, pageCompression=page_compression)
     
-    for header, pos in zip(headers, positions):
-        c.drawString(pos, y, header)
-    y -= 20
+    # Static layout + field values
+    template.begin(c, {
+        "invoice_number": invoice_dict['invoice_number'],
+        "date": invoice_dict['date'],
+        "seller_name": invoice_dict['seller']['name'],
+        "seller_gstin": invoice_dict['seller'].get('gstin', ''),
+        "buyer_name": invoice_dict['buyer'].get('name', ''),
+        "buyer_state": invoice_dict['buyer'].get('state', ''),
+    })
+    positions = template.positions
+    y = template.rows_top
     
     # Table Items
-    c.setFont("Helvetica", 9)
-    for item in invoice_dict['items']:
-        c.drawString(positions[0], y, str(item['sr']))
-        c.drawString(positions[1], y, str(item['description'])[:35])
-        c.drawString(positions[2], y, str(item.get('hsn', '')))
-        c.drawString(positions[3], y, str(item['qty']))
-        c.drawString(positions[4], y, f"{item['unit_price']:.2f}")
-        c.drawString(positions[5], y, f"{item['taxable']:.2f}")
-        y -= 15
+    text = _begin_rows(c)
+    line_total_paise = 0
+    for item in items:
+        cells = (str(item['sr']),
+                 str(item['description'])[:35],
+                 str(item.get('hsn', '')),
+                 str(item['qty']),
+                 f"{item['unit_price']:.2f}",
+                 f"{item['taxable']:.2f}")
+        for pos, cell in zip(positions, cells):
+            text.setTextOrigin(pos, y)
+            text.textLine(cell)
+        line_total_paise += to_paise(item.get('line_total', 0))
+        y -= _ROW_HEIGHT
         
         # Page break if needed
-        if y < 100:
+        if y < _PAGE_BOTTOM:
+            c.drawText(text)
             c.showPage()
-            y = height - 40
-            c.setFont("Helvetica", 9)
+            template.continue_page(c)
+            y = template.continuation_rows_top
+            text = _begin_rows(c)
+    c.drawText(text)
     
     # Grand Total
+    totals = invoice_dict.get('totals')
+    grand_total = totals['grand_total'] if totals else from_paise(line_total_paise)
     y -= 20
     c.setFont("Helvetica-Bold", 10)
     c.drawString(positions[4], y, "Grand Total:")
-    c.drawString(positions[5], y, f"{invoice_dict['totals']['grand_total']:.2f}")
+    c.drawString(positions[5], y, f"{grand_total:.2f}")
     
     c.showPage()
     c.save()
-    buffer.seek(0)
-    return buffer.read()
 
-def generate_invoice_image_bytes(invoice_dict, width=1000, row_height=30):
+def generate_invoice_pdf(invoice_dict):
+    buffer = BytesIO()
+    render_invoice_pdf(invoice_dict, buffer)
+    return buffer.getvalue()
+
+# Resolved once per process: (regular, bold) per font size
+_IMAGE_FONTS = {}
+_FONT_CANDIDATES = [("arial.ttf", "arialbd.ttf"), ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf")]
+
+# Background/ink per output mode; "P" uses a two-entry white/black palette
+_IMAGE_COLORS = {"RGB": ("white", "black"), "L": (255, 0), "1": (1, 0), "P": (0, 1)}
+_PALETTE = [255, 255, 255, 0, 0, 0]
+
+def _image_fonts(size=14):
+    if size not in _IMAGE_FONTS:
+        fonts = None
+        for regular, bold in _FONT_CANDIDATES:
+            try:
+                fonts = (ImageFont.truetype(regular, size), ImageFont.truetype(bold, size))
+                break
+            except OSError:
+                continue
+        if fonts is None:
+            default = ImageFont.load_default()
+            fonts = (default, default)
+        _IMAGE_FONTS[size] = fonts
+    return _IMAGE_FONTS[size]
+
+def _image_height(invoice_dict, row_height):
     rows = max(len(invoice_dict['items']), 1) + 6
-    height = rows * row_height + 200
-    img = Image.new("RGB", (width, height), "white")
-    draw = ImageDraw.Draw(img)
-    
-    try:
-        font = ImageFont.truetype("arial.ttf", 14)
-        font_bold = ImageFont.truetype("arialbd.ttf", 14)
-    except:
-        font = ImageFont.load_default()
-        font_bold = ImageFont.load_default()
-    
+    return rows * row_height + 200
+
+def _new_canvas(mode, width, height):
+    if mode not in _IMAGE_COLORS:
+        raise ValueError(f"Unsupported image mode: {mode}")
+    img = Image.new(mode, (width, height), _IMAGE_COLORS[mode][0])
+    if mode == "P":
+        img.putpalette(_PALETTE)
+    return img
+
+def _draw_invoice(draw, invoice_dict, width, row_height, ink):
+    font, font_bold = _image_fonts()
     y = 30
     
     # Header
-    draw.text((width/2 - 100, y), "TAX INVOICE", font=font_bold, fill="black")
+    draw.text((width/2 - 100, y), "TAX INVOICE", font=font_bold, fill=ink)
     y += 40
     
     # Invoice Details
-    draw.text((50, y), f"Invoice: {invoice_dict['invoice_number']}", font=font, fill="black")
-    draw.text((width/2, y), f"Date: {invoice_dict['date']}", font=font, fill="black")
+    draw.text((50, y), f"Invoice: {invoice_dict['invoice_number']}", font=font, fill=ink)
+    draw.text((width/2, y), f"Date: {invoice_dict['date']}", font=font, fill=ink)
     y += 30
     
     # Seller & Buyer
-    draw.text((50, y), f"Seller: {invoice_dict['seller']['name']}", font=font, fill="black")
-    draw.text((width/2, y), f"GSTIN: {invoice_dict['seller'].get('gstin', '')}", font=font, fill="black")
+    draw.text((50, y), f"Seller: {invoice_dict['seller']['name']}", font=font, fill=ink)
+    draw.text((width/2, y), f"GSTIN: {invoice_dict['seller'].get('gstin', '')}", font=font, fill=ink)
     y += 25
     
-    draw.text((50, y), f"Buyer: {invoice_dict['buyer'].get('name', '')}", font=font, fill="black")
-    draw.text((width/2, y), f"State: {invoice_dict['buyer'].get('state', '')}", font=font, fill="black")
+    draw.text((50, y), f"Buyer: {invoice_dict['buyer'].get('name', '')}", font=font, fill=ink)
+    draw.text((width/2, y), f"State: {invoice_dict['buyer'].get('state', '')}", font=font, fill=ink)
     y += 40
     
     # Table Header
     header_text = "Sr   Description               HSN   Qty   Unit   Taxable"
-    draw.text((50, y), header_text, font=font_bold, fill="black")
+    draw.text((50, y), header_text, font=font_bold, fill=ink)
     y += row_height
     
     # Table Items
@@ -113,29 +248,92 @@ def generate_invoice_image_bytes(invoice_dict, width=1000, row_height=30):
         item_text = (f"{item['sr']}   {item['description'][:20]:<20}   "
                     f"{item.get('hsn', ''):<8}   {item['qty']:<4}   "
                     f"{item['unit_price']:<6.2f}   {item['taxable']:<8.2f}")
-        draw.text((50, y), item_text, font=font, fill="black")
+        draw.text((50, y), item_text, font=font, fill=ink)
         y += row_height
     
     # Grand Total
     y += 20
     draw.text((50, y), f"Grand Total: {invoice_dict['totals']['grand_total']:.2f}", 
-              font=font_bold, fill="black")
-    
+              font=font_bold, fill=ink)
+
+def _png_bytes(img, compress_level):
     buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+    img.save(buffer, format="PNG", compress_level=compress_level)
     return buffer.getvalue()
 
+def generate_invoice_image_bytes(invoice_dict, width=1000, row_height=30, mode="RGB", compress_level=6):
+    """Render an invoice as PNG bytes.
+
+    mode is "RGB", "L" (grayscale), "P" (2-colour palette) or "1" (1-bit); the last two
+    give much smaller previews. compress_level is the zlib level (0-9) for the PNG.
+    """
+    img = _new_canvas(mode, width, _image_height(invoice_dict, row_height))
+    _draw_invoice(ImageDraw.Draw(img), invoice_dict, width, row_height, _IMAGE_COLORS[mode][1])
+    return _png_bytes(img, compress_level)
+
+def generate_invoice_images(invoices, width=1000, row_height=30, mode="1", compress_level=1):
+    """Yield PNG bytes for each invoice, reusing one canvas buffer across the batch.
+
+    Intended for thumbnail previews of many invoices: defaults to 1-bit output and fast
+    compression. The canvas only grows when an invoice needs more rows than any before it.
+    """
+    background, ink = _IMAGE_COLORS[mode]
+    img, draw = None, None
+    for invoice_dict in invoices:
+        height = _image_height(invoice_dict, row_height)
+        if img is None or img.height < height:
+            img = _new_canvas(mode, width, height)
+            draw = ImageDraw.Draw(img)
+        else:
+            draw.rectangle((0, 0, width, height), fill=background)
+        _draw_invoice(draw, invoice_dict, width, row_height, ink)
+        page = img if img.height == height else img.crop((0, 0, width, height))
+        yield _png_bytes(page, compress_level)
+
+# Rows converted from the DataFrame per append batch when streaming XLSX
+_XLSX_CHUNK_ROWS = 10000
+_XLSX_MAX_WIDTH = 50
+
+def xlsx_column_widths(df):
+    """Column widths (header or longest rendered value + 2, capped) computed per column, not per cell."""
+    widths = []
+    for col in df.columns:
+        values = df[col]
+        longest = values.astype(str).str.len().max() if len(values) else 0
+        widths.append(min(max(len(str(col)), int(longest)) + 2, _XLSX_MAX_WIDTH))
+    return widths
+
+def write_xlsx(sheets, sink, autofit=True):
+    """Stream DataFrames into an XLSX workbook using openpyxl's write-only mode.
+
+    sheets maps sheet name -> DataFrame; sink is a path or binary file-like object.
+    Rows are converted and appended in chunks, so memory stays flat for large merges.
+    """
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(title=name)
+        if autofit:
+            for idx, width in enumerate(xlsx_column_widths(df), start=1):
+                ws.column_dimensions[get_column_letter(idx)].width = width
+        header = []
+        for col in df.columns:
+            cell = WriteOnlyCell(ws, value=str(col))
+            cell.font = _XLSX_HEADER_FONT
+            header.append(cell)
+        ws.append(header)
+        for start in range(0, len(df), _XLSX_CHUNK_ROWS):
+            chunk = df.iloc[start:start + _XLSX_CHUNK_ROWS]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                ws.append(row)
+    wb.save(sink)
+
 def generate_invoice_xlsx_bytes(invoice_dict):
-    df = pd.DataFrame(invoice_dict['items'])
     buffer = BytesIO()
-    
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Items")
-        totals_df = pd.DataFrame([invoice_dict['totals']])
-        totals_df.to_excel(writer, index=False, sheet_name="Totals")
-    
-    buffer.seek(0)
+    write_xlsx({
+        "Items": pd.DataFrame(invoice_dict['items']),
+        "Totals": pd.DataFrame([invoice_dict['totals']])
+    }, buffer)
     return buffer.getvalue()
 
 def generate_invoice_csv_bytes(invoice_dict):
@@ -143,4 +341,75 @@ def generate_invoice_csv_bytes(invoice_dict):
     buffer = BytesIO()
     buffer.write(df.to_csv(index=False).encode('utf-8'))
     buffer.seek(0)
-    return buffer.getvalue()
\ No newline at end of file
+    return buffer.getvalue()
+# Merged-dataset export formats: key -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    "xlsx": ("Excel (.xlsx)", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "json": ("JSON (.json)", "json", "application/json"),
+    "ndjson": ("NDJSON (.ndjson)", "ndjson", "application/x-ndjson"),
+    "csv": ("CSV (.csv)", "csv", "text/csv"),
+}
+# Parquet needs pyarrow, which is optional
+if importlib.util.find_spec("pyarrow") is not None:
+    EXPORT_FORMATS["parquet"] = ("Parquet (.parquet)", "parquet", "application/vnd.apache.parquet")
+
+# Rows serialised per chunk for NDJSON and per row group for Parquet
+_EXPORT_CHUNK_ROWS = 50000
+
+def _arrow_safe(df):
+    """Cast mixed-type object columns (e.g. HSN codes read as both int and str) to str for Arrow."""
+    mixed = [col for col in df.columns
+             if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) != "string"]
+    if not mixed:
+        return df
+    return df.assign(**{col: df[col].where(df[col].isna(), df[col].astype(str)) for col in mixed})
+
+def write_parquet(df, sink):
+    """Write a DataFrame as Parquet (Arrow) straight from its columns; sink is a path or binary file."""
+    _arrow_safe(df).to_parquet(sink, engine="pyarrow", index=False, row_group_size=_EXPORT_CHUNK_ROWS)
+
+def write_ndjson(df, sink):
+    """Write one JSON object per line, serialised from the DataFrame in chunks (no record dicts)."""
+    for start in range(0, len(df), _EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + _EXPORT_CHUNK_ROWS]
+        text = chunk.to_json(orient="records", lines=True, force_ascii=False)
+        sink.write(text.encode("utf-8"))
+        if not text.endswith("\n"):
+            sink.write(b"\n")
+
+def generate_invoice_parquet_bytes(invoice_dict):
+    buffer = BytesIO()
+    write_parquet(pd.DataFrame(invoice_dict['items']), buffer)
+    return buffer.getvalue()
+
+def generate_invoice_ndjson_bytes(invoice_dict):
+    buffer = BytesIO()
+    write_ndjson(pd.DataFrame(invoice_dict['items']), buffer)
+    return buffer.getvalue()
+
+def dataframe_fingerprint(df):
+    """Content hash of a DataFrame (columns + values), used to memoise its exports."""
+    h = hashlib.sha256(repr(list(df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def invoice_fingerprint(invoice_dict):
+    """Content hash of an invoice dict, used to memoise its exports."""
+    payload = json.dumps(invoice_dict, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def export_dataframe_bytes(df, fmt, sheet_name="AllInvoices"):
+    """Serialise a merged dataset to one of EXPORT_FORMATS."""
+    if fmt == "xlsx":
+        buffer = BytesIO()
+        write_xlsx({sheet_name: df}, buffer)
+        return buffer.getvalue()
+    if fmt == "json":
+        return json.dumps(df.to_dict('records'), indent=4, ensure_ascii=False).encode('utf-8')
+    if fmt == "csv":
+        return df.to_csv(index=False).encode('utf-8')
+    if fmt in ("ndjson", "parquet"):
+        buffer = BytesIO()
+        (write_ndjson if fmt == "ndjson" else write_parquet)(df, buffer)
+        return buffer.getvalue()
+    raise ValueError(f"Unknown export format: {fmt}")
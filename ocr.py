@@ -0,0 +1,105 @@
+import numpy as np # type: ignore
+import pytesseract # type: ignore
+from PIL import Image, ImageFilter, ImageOps # type: ignore
+
+# tesseract reads best at ~300 DPI; larger images only cost time
+OCR_TARGET_DPI = 300
+
+# Page segmentation / engine presets. "page" is tesseract's default automatic layout,
+# "block" treats the image as one uniform block (faster and steadier on table-like
+# invoices), "line" a single text line and "digits" a numeric column or cell.
+TESSERACT_PRESETS = {
+    "page": "--oem 1 --psm 3",
+    "block": "--oem 1 --psm 6",
+    "line": "--oem 1 --psm 7",
+    "digits": "--oem 1 --psm 6 -c tessedit_char_whitelist=0123456789.,-",
+}
+DEFAULT_PRESET = "page"
+
+_A4_LONG_SIDE_IN = 11.69
+_DESKEW_MAX_ANGLE = 5.0
+_DESKEW_SAMPLE_PX = 800
+_INK_OFFSET = 12  # grey levels below the local mean that count as ink
+
+def _source_dpi(img: Image.Image, source_dpi: int = None) -> float:
+    """Known DPI, else the image's own if plausible (phone photos claim 72), else
+    assume the longer side spans an A4 page."""
+    if source_dpi:
+        return float(source_dpi)
+    dpi = img.info.get("dpi")
+    if dpi and dpi[0] >= 150:
+        return float(dpi[0])
+    return max(img.size) / _A4_LONG_SIDE_IN
+
+def ink_mask(gray: Image.Image, dpi: float, offset: int = _INK_OFFSET) -> np.ndarray:
+    """True where a pixel is clearly darker than its surroundings (adaptive threshold).
+
+    Comparing against a local mean instead of one global level keeps shadows, uneven
+    lighting and the desk around a photographed page from turning into ink. A radius-1
+    blur first keeps sensor noise from speckling flat areas.
+    """
+    smooth = gray.filter(ImageFilter.BoxBlur(1))
+    local = gray.filter(ImageFilter.BoxBlur(max(2, int(dpi / 12))))
+    return np.asarray(smooth, dtype=np.int16) < np.asarray(local, dtype=np.int16) - offset
+
+def _skew_angle(ink: np.ndarray) -> float:
+    """Rotation (degrees) that makes text rows horizontal, from the row-profile sharpness
+    of a downsampled ink mask: coarse 0.5 degree search, then 0.1 around the best."""
+    sample = Image.fromarray(ink.astype(np.uint8) * 255)
+    scale = _DESKEW_SAMPLE_PX / max(sample.size)
+    if scale < 1:
+        sample = sample.resize((max(1, int(sample.width * scale)), max(1, int(sample.height * scale))),
+                               Image.Resampling.BOX)
+
+    def score(angle):
+        rows = np.asarray(sample.rotate(angle, resample=Image.Resampling.NEAREST), dtype=np.float64).sum(axis=1)
+        return float(np.square(np.diff(rows)).sum())
+
+    best = max(np.arange(-_DESKEW_MAX_ANGLE, _DESKEW_MAX_ANGLE + 0.01, 0.5), key=score)
+    return float(max(np.arange(best - 0.4, best + 0.41, 0.1), key=score))
+
+def preprocess_for_ocr(img: Image.Image, source_dpi: int = None, target_dpi: int = OCR_TARGET_DPI,
+                       deskew: bool = True, crop: bool = True) -> Image.Image:
+    """Grayscale, downscale to target_dpi, deskew, binarise and crop to the inked area.
+
+    Returns an "L" image of pure black on white with info["dpi"] set to its resolution.
+    """
+    gray = ImageOps.exif_transpose(img).convert("L")
+    dpi = _source_dpi(img, source_dpi)
+    if dpi > target_dpi:
+        scale = target_dpi / dpi
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                           Image.Resampling.LANCZOS)
+        dpi = float(target_dpi)
+    ink = ink_mask(gray, dpi)
+    binary = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+    if deskew:
+        angle = _skew_angle(ink)
+        if abs(angle) >= 0.2:
+            # rotate after binarising so the blank corners added by expand are plain
+            # paper rather than a new edge against the photo background
+            binary = binary.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+            binary = binary.point(lambda v: 255 if v >= 128 else 0)
+    if crop:
+        box = ImageOps.invert(binary).getbbox()
+        if box:
+            pad = int(dpi / 10)
+            binary = binary.crop((max(0, box[0] - pad), max(0, box[1] - pad),
+                                  min(binary.width, box[2] + pad), min(binary.height, box[3] + pad)))
+    binary.info["dpi"] = (dpi, dpi)
+    return binary
+
+def tesseract_config(preset: str = DEFAULT_PRESET, dpi: float = None) -> str:
+    if preset not in TESSERACT_PRESETS:
+        raise ValueError(f"Unknown tesseract preset: {preset}")
+    config = TESSERACT_PRESETS[preset]
+    # tell tesseract the resolution instead of letting it guess from the pixel size
+    return f"{config} --dpi {int(round(dpi))}" if dpi else config
+
+def ocr_image(img: Image.Image, preset: str = DEFAULT_PRESET, source_dpi: int = None,
+              preprocess: bool = True) -> str:
+    """OCR one image with a TESSERACT_PRESETS preset, preprocessed unless preprocess=False."""
+    if preprocess:
+        img = preprocess_for_ocr(img, source_dpi=source_dpi)
+        return pytesseract.image_to_string(img, config=tesseract_config(preset, img.info["dpi"][0]))
+    return pytesseract.image_to_string(img, config=tesseract_config(preset, source_dpi))
@@ -0,0 +1,165 @@
+import io
+import re
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd # type: ignore
+import pdfplumber # type: ignore
+
+ITEM_COLUMNS = ["Description", "qty", "unit_price", "hsn"]
+# Columns an item table header must name; "hsn" is read when present
+REQUIRED_COLUMNS = ITEM_COLUMNS[:3]
+
+# Header keywords per item column, best first. A price header wins over a bare "Unit"
+# column, and rate columns that are really tax rates ("GST Rate", "Rate %") are ignored.
+# "hsn" comes first so an "Item HSN" column is not taken for the description.
+_HEADER_KEYWORDS = {
+    "hsn": ["hsn", "sac code"],
+    "Description": ["description", "particulars", "item", "product", "goods", "details"],
+    "qty": ["qty", "quantity", "qnty"],
+    "unit_price": ["unit price", "price", "rate", "unit"],
+}
+_NOT_PRICE = re.compile(r"gst|tax|%|amount|total")
+_TOTAL_ROW = re.compile(r"\b(?:sub\s*-?\s*total|grand\s+total|total)\b", re.IGNORECASE)
+NUMBER_JUNK = re.compile(r"[,\s]|₹|rs\.?|inr", re.IGNORECASE)
+_LINE_TOLERANCE = 3  # points; words whose tops differ by less share a text line
+
+def iter_pdf_pages(pdf_bytes: bytes) -> Iterator:
+    """Yield pdfplumber pages one at a time, releasing each page's layout cache after use."""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            try:
+                yield page
+            finally:
+                page.close()
+
+def _number(cell) -> Optional[float]:
+    if cell is None:
+        return None
+    try:
+        return float(NUMBER_JUNK.sub("", str(cell)))
+    except ValueError:
+        return None
+
+def header_columns(cells: List[str]) -> Optional[Dict[str, int]]:
+    """Map item columns to cell indexes if cells look like an item table header."""
+    if any(_number(c) is not None for c in cells):
+        return None
+    labels = [" ".join(str(c or "").lower().split()) for c in cells]
+    found = {}
+    for col, keywords in _HEADER_KEYWORDS.items():
+        for keyword in keywords:
+            for idx, label in enumerate(labels):
+                if idx in found.values() or keyword not in label:
+                    continue
+                if col == "unit_price" and _NOT_PRICE.search(label):
+                    continue
+                found[col] = idx
+                break
+            if col in found:
+                break
+    return found if all(col in found for col in REQUIRED_COLUMNS) else None
+
+class PdfItemTable:
+    """Reads the line-item table of a PDF page by page.
+
+    Ruled tables come from pdfplumber's table finder; otherwise columns are inferred
+    from the x positions of the header words and each text line is split into cells
+    by word position. Header rows repeated on continuation pages are skipped, wrapped
+    description lines are joined to the item above, and reading stops at the first
+    total row, so feed() can be skipped for the pages after it (see done).
+    """
+
+    def __init__(self):
+        self.rows: List[Dict] = []
+        self.done = False
+        self._ruled = None  # {column: cell index} from a ruled table header
+        self._layout = None  # header cell x spans + column map from word positions
+
+    def feed(self, page) -> None:
+        if self.done:
+            return
+        for table in page.extract_tables():
+            self._read_table(table)
+            if self.done:
+                return
+        if self._ruled is None:
+            self._read_words(page)
+
+    def _read_table(self, table: List[List]) -> None:
+        for cells in table:
+            header = header_columns(cells)
+            if header:
+                self._ruled = header
+            elif self._ruled and self._add_row({col: cells[idx] if idx < len(cells) else None
+                                                for col, idx in self._ruled.items()}, cells):
+                return
+
+    def _read_words(self, page) -> None:
+        for words in self._lines(page.extract_words()):
+            layout = self._word_header(words)
+            if layout:
+                self._layout = layout
+            elif self._layout and self._add_row(self._cells(words, self._layout), [w["text"] for w in words]):
+                return
+
+    def _add_row(self, row: Dict, raw: List) -> bool:
+        """Record one table row; returns True once the table has ended."""
+        qty, price = _number(row.get("qty")), _number(row.get("unit_price"))
+        desc = " ".join(str(row.get("Description") or "").split())
+        if qty is None or price is None:
+            if _TOTAL_ROW.search(" ".join(str(c or "") for c in raw)):
+                self.done = True
+            elif desc and self.rows and " ".join(" ".join(str(c or "") for c in raw).split()) == desc:
+                # wrapped description: nothing on the line outside the description column
+                self.rows[-1]["Description"] += " " + desc
+            return self.done
+        if desc:
+            self.rows.append({"Description": desc, "qty": int(qty) if qty.is_integer() else qty, "unit_price": price,
+                              "hsn": " ".join(str(row.get("hsn") or "").split())})
+        return False
+
+    @staticmethod
+    def _lines(words: List[Dict]) -> Iterator[List[Dict]]:
+        line, top = [], None
+        for w in sorted(words, key=lambda w: (round(w["top"]), w["x0"])):
+            if top is not None and abs(w["top"] - top) > _LINE_TOLERANCE:
+                yield sorted(line, key=lambda w: w["x0"])
+                line = []
+            if not line:
+                top = w["top"]
+            line.append(w)
+        if line:
+            yield sorted(line, key=lambda w: w["x0"])
+
+    @staticmethod
+    def _word_header(words: List[Dict]):
+        """Header cell x spans (words closer than about a space merged) and the item
+        column map, or None if the line is not an item table header."""
+        cells = []
+        for w in words:
+            if cells and w["x0"] - cells[-1]["x1"] < 0.6 * (w["bottom"] - w["top"]):
+                cells[-1] = {"text": cells[-1]["text"] + " " + w["text"], "x0": cells[-1]["x0"], "x1": w["x1"]}
+            else:
+                cells.append({"text": w["text"], "x0": w["x0"], "x1": w["x1"]})
+        header = header_columns([c["text"] for c in cells])
+        if not header:
+            return None
+        return {"cells": [(c["x0"], c["x1"]) for c in cells], "columns": header}
+
+    @staticmethod
+    def _cells(words: List[Dict], layout: Dict) -> Dict:
+        """Split a text line into header cells: by overlap with the header word, else the
+        nearest header starting to the left (left-aligned text running past its heading)."""
+        bounds = layout["cells"]
+        texts = [[] for _ in bounds]
+        for w in words:
+            overlap = [min(w["x1"], x1) - max(w["x0"], x0) for x0, x1 in bounds]
+            best = max(range(len(bounds)), key=overlap.__getitem__)
+            if overlap[best] <= 0:
+                left = [i for i, (x0, _) in enumerate(bounds) if x0 <= w["x0"]]
+                best = left[-1] if left else 0
+            texts[best].append(w["text"])
+        return {col: " ".join(texts[idx]) for col, idx in layout["columns"].items()}
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows, columns=ITEM_COLUMNS)
@@ -0,0 +1,130 @@
+import io
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+from pdf_items import ITEM_COLUMNS, NUMBER_JUNK, REQUIRED_COLUMNS, header_columns
+
+CSV_CHUNK_ROWS = 50_000
+# How far down a sheet to look for the header row (title/address rows may come first)
+HEADER_SCAN_ROWS = 10
+
+def _numeric(values: pd.Series) -> pd.Series:
+    """Vectorised float coercion; text cells lose thousands separators and currency marks."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(np.float64)
+    cleaned = values.astype("string").str.replace(NUMBER_JUNK.pattern, "", regex=True, case=False)
+    return pd.to_numeric(cleaned, errors="coerce").astype(np.float64)
+
+def _codes(values: pd.Series) -> np.ndarray:
+    """HSN cells as text, exactly as written where the cell is text.
+
+    Numeric cells keep whole numbers only: a fractional one ("0902.10" stored as
+    902.1) has lost its zeros and cannot be trusted, so it becomes "" and the item
+    is matched by description instead. Blanks become "".
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        is_text = np.zeros(len(values), dtype=bool)
+    elif isinstance(values.dtype, pd.StringDtype):
+        is_text = values.notna().to_numpy(dtype=bool)
+    else:
+        is_text = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    nums = pd.to_numeric(values.where(~is_text), errors="coerce").to_numpy(dtype=np.float64)
+    whole = np.isfinite(nums) & (nums % 1 == 0)
+    codes = np.full(len(values), "", dtype=object)
+    codes[whole] = nums[whole].astype(np.int64).astype(str)
+    codes[is_text] = values[is_text].str.strip().to_numpy(dtype=object)
+    return codes
+
+def column_map(df: pd.DataFrame) -> Tuple[Optional[Dict[str, int]], int]:
+    """({item column: position}, rows to skip) for a raw sheet.
+
+    Uses the column headers, else the first of the top HEADER_SCAN_ROWS rows that
+    looks like a header, else None.
+    """
+    columns = header_columns([str(c) for c in df.columns])
+    if columns:
+        return columns, 0
+    top = df.head(HEADER_SCAN_ROWS).astype("string").fillna("")
+    for offset, cells in enumerate(top.itertuples(index=False, name=None), start=1):
+        columns = header_columns(list(cells))
+        if columns:
+            return columns, offset
+    return None, 0
+
+def items_frame(df: pd.DataFrame, columns: Dict[str, int] = None, skip: int = 0) -> pd.DataFrame:
+    """Description/qty/unit_price/hsn frame of the valid item rows of a raw sheet.
+
+    columns maps item columns to positions (default: detected by header name via
+    column_map, falling back to the first three columns). hsn is "" unless the
+    sheet has an HSN column. Rows without a
+    description, or whose qty or price is not a number, are dropped by mask. qty is
+    int64 when every value is whole.
+    """
+    if columns is None:
+        columns, skip = column_map(df)
+    if columns is None:
+        if df.shape[1] < 3:
+            return pd.DataFrame(columns=ITEM_COLUMNS)
+        columns = {col: idx for idx, col in enumerate(REQUIRED_COLUMNS)}
+    body = df.iloc[skip:]
+    desc = body.iloc[:, columns["Description"]].astype("string").str.strip()
+    qty = _numeric(body.iloc[:, columns["qty"]])
+    price = _numeric(body.iloc[:, columns["unit_price"]])
+    mask = (desc.notna() & desc.ne("") & np.isfinite(qty) & np.isfinite(price)).to_numpy(dtype=bool)
+    if "hsn" in columns:
+        hsn = _codes(body.iloc[:, columns["hsn"]])
+    else:
+        hsn = np.full(len(body), "", dtype=object)
+    items = pd.DataFrame({
+        "Description": desc.to_numpy(dtype=object)[mask],
+        "qty": qty.to_numpy()[mask],
+        "unit_price": price.to_numpy()[mask],
+        "hsn": hsn[mask],
+    })
+    if len(items) and (items["qty"] % 1 == 0).all():
+        items["qty"] = items["qty"].astype(np.int64)
+    return items
+
+def _concat(frames: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    frames = [f for f in frames if len(f)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ITEM_COLUMNS)
+
+def read_csv_items(file_bytes: bytes, chunk_rows: int = CSV_CHUNK_ROWS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(items, head) from CSV bytes, read chunk_rows rows at a time.
+
+    The column map is detected on the first chunk and reused for the rest; head is
+    the first chunk's top rows (for field detection). Cells are read as text so HSN
+    codes keep their leading and trailing zeros; qty and price are coerced by column.
+    """
+    frames, head, columns = [], None, None
+    with pd.read_csv(io.BytesIO(file_bytes), chunksize=chunk_rows, dtype=str) as reader:
+        for chunk in reader:
+            skip = 0
+            if head is None:
+                head = chunk.head(HEADER_SCAN_ROWS * 2)
+                columns, skip = column_map(chunk)
+            frames.append(items_frame(chunk, columns, skip) if columns else items_frame(chunk))
+    return _concat(frames), head if head is not None else pd.DataFrame()
+
+def read_excel_items(file_bytes: bytes) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(items, head) from every sheet of an XLSX workbook, each read once.
+
+    Sheets whose headers name the item columns are all used; if none do, the first
+    sheet is read positionally (description, qty, price as its first three columns).
+    Cells keep their own type (dtype=object), so a text HSN code is not parsed as a
+    number just because the rest of its column is numeric.
+    """
+    sheets = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None, dtype=object)
+    if not sheets:
+        return pd.DataFrame(columns=ITEM_COLUMNS), pd.DataFrame()
+    frames = []
+    for df in sheets.values():
+        columns, skip = column_map(df)
+        if columns:
+            frames.append(items_frame(df, columns, skip))
+    first = next(iter(sheets.values()))
+    if not frames:
+        frames = [items_frame(first)]
+    return _concat(frames), first.head(HEADER_SCAN_ROWS * 2)
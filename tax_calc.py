@@ -1,27 +1,158 @@
+import math
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+# Amounts are held as integer paise; GST rates as integer basis points (18% -> 1800)
+# and quantities as integer thousandths, so every product below is exact int64.
+ROUND_PER_LINE = "per_line"        # round each line's tax, totals are sums of lines
+ROUND_PER_INVOICE = "per_invoice"  # sum unrounded tax per invoice, round once
+DEFAULT_ROUNDING = ROUND_PER_LINE
+
+_QTY_SCALE = 1000
+_RATE_SCALE = 100
+_CGST_DEN = 2 * _RATE_SCALE * 100  # half the rate, rate in basis points
+_IGST_DEN = _RATE_SCALE * 100
+_TOTAL_KEYS = ["taxable_value", "cgst", "sgst", "igst", "grand_total"]
+
+# Both engines reject NaN/inf quantities, prices and rates with ValueError, so a
+# blank catalog rate can never silently turn into zero tax
+def _scale_half_up(val, scale):
+    if not math.isfinite(float(val)):
+        raise ValueError(f"GST input is not a finite number: {val!r}")
+    return int((Decimal(str(val)) * scale).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def _scale_half_up_array(values, scale):
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ValueError(f"GST inputs are not all finite numbers (row {int(np.argmin(np.isfinite(values)))})")
+    # round to 6 places first so 1.005 * 100 == 100.49999... still rounds up
+    scaled = np.round(values * scale, 6)
+    return (np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)).astype(np.int64)
+
+def _div_half_up(num, den):
+    """Integer num / den rounded half away from zero (python ints)."""
+    q = (2 * abs(num) + den) // (2 * den)
+    return -q if num < 0 else q
+
+def _div_half_up_array(num, den):
+    """Integer num / den rounded half away from zero (int64 arrays)."""
+    q = (2 * np.abs(num) + den) // (2 * den)
+    return np.where(num < 0, -q, q)
+
+def to_paise(val) -> int:
+    """Rupee amount -> integer paise, rounded half-up."""
+    return _scale_half_up(val, 100)
+
+def to_paise_array(values) -> np.ndarray:
+    """Vectorised to_paise over an array-like; returns int64."""
+    return _scale_half_up_array(values, 100)
+
+def from_paise(paise):
+    """Integer paise (scalar or array) -> rupees as float."""
+    if np.ndim(paise):
+        return np.asarray(paise, dtype=np.int64) / 100
+    return int(paise) / 100
+
+def _same_state(seller_state, buyer_state):
+    return seller_state.strip().lower() == buyer_state.strip().lower()
+
 def compute_line(qty, unit_price, rate, seller_state, buyer_state):
     """
     Compute tax breakdown for one invoice line.
     If seller_state == buyer_state → CGST + SGST
     Else → IGST
+    Amounts are exact to the paisa, each rounded half-up.
     """
-    taxable = qty * unit_price
-    igst = cgst = sgst = 0.0
-    if seller_state.strip().lower() == buyer_state.strip().lower():
-        cgst = taxable * (rate/2) / 100
-        sgst = taxable * (rate/2) / 100
+    taxable = _div_half_up(_scale_half_up(qty, _QTY_SCALE) * to_paise(unit_price), _QTY_SCALE)
+    rate_bp = _scale_half_up(rate, _RATE_SCALE)
+    igst = cgst = sgst = 0
+    if _same_state(seller_state, buyer_state):
+        cgst = _div_half_up(taxable * rate_bp, _CGST_DEN)
+        sgst = cgst
     else:
-        igst = taxable * rate / 100
+        igst = _div_half_up(taxable * rate_bp, _IGST_DEN)
 
     line_total = taxable + cgst + sgst + igst
     return {
+        "taxable": from_paise(taxable),
+        "cgst": from_paise(cgst),
+        "sgst": from_paise(sgst),
+        "igst": from_paise(igst),
+        "line_total": from_paise(line_total)
+    }
+
+def _same_state_mask(seller_state, buyer_state, n):
+    """Boolean array: True where the line is intra-state (CGST + SGST)."""
+    if isinstance(seller_state, str) and isinstance(buyer_state, str):
+        return np.full(n, _same_state(seller_state, buyer_state))
+    seller = pd.Series(np.broadcast_to(np.asarray(seller_state, dtype=object), n))
+    buyer = pd.Series(np.broadcast_to(np.asarray(buyer_state, dtype=object), n))
+    return (seller.astype(str).str.strip().str.lower()
+            == buyer.astype(str).str.strip().str.lower()).to_numpy()
+
+def compute_lines_paise(qty, unit_price, rate, seller_state, buyer_state,
+                        invoice_ids=None, rounding=DEFAULT_ROUNDING):
+    """
+    Integer-paise engine behind compute_lines.
+    Returns (lines, totals): lines is a DataFrame of int64 paise columns
+    taxable/cgst/sgst/igst/line_total; totals is a DataFrame of int64 paise
+    taxable_value/cgst/sgst/igst/grand_total indexed by invoice id (a single
+    row keyed None when invoice_ids is not given).
+    With ROUND_PER_INVOICE the tax totals are rounded once per invoice from the
+    exact sum of line taxes instead of summing already-rounded line taxes.
+    """
+    if rounding not in (ROUND_PER_LINE, ROUND_PER_INVOICE):
+        raise ValueError(f"Unknown GST rounding policy: {rounding}")
+    qty_milli = _scale_half_up_array(qty, _QTY_SCALE)
+    taxable = _div_half_up_array(qty_milli * to_paise_array(unit_price), _QTY_SCALE)
+    rate_bp = _scale_half_up_array(rate, _RATE_SCALE)
+    same = _same_state_mask(seller_state, buyer_state, len(taxable))
+    # exact tax numerators; dividing by the denominator gives paise
+    cgst_num = np.where(same, taxable * rate_bp, 0)
+    igst_num = np.where(same, 0, taxable * rate_bp)
+    cgst = _div_half_up_array(cgst_num, _CGST_DEN)
+    igst = _div_half_up_array(igst_num, _IGST_DEN)
+    lines = pd.DataFrame({
         "taxable": taxable,
         "cgst": cgst,
-        "sgst": sgst,
+        "sgst": cgst,
         "igst": igst,
-        "line_total": line_total
-    }
+        "line_total": taxable + 2 * cgst + igst
+    })
+
+    keys = pd.Series(invoice_ids if invoice_ids is not None else np.zeros(len(taxable), dtype=np.int8))
+    if rounding == ROUND_PER_LINE:
+        grouped = pd.DataFrame({"taxable_value": taxable, "cgst": cgst, "igst": igst}).groupby(keys.to_numpy(), sort=False).sum()
+    else:
+        grouped = pd.DataFrame({"taxable_value": taxable, "cgst": cgst_num, "igst": igst_num}).groupby(keys.to_numpy(), sort=False).sum()
+        grouped["cgst"] = _div_half_up_array(grouped["cgst"].to_numpy(), _CGST_DEN)
+        grouped["igst"] = _div_half_up_array(grouped["igst"].to_numpy(), _IGST_DEN)
+    grouped["sgst"] = grouped["cgst"]
+    grouped["grand_total"] = grouped["taxable_value"] + grouped["cgst"] + grouped["sgst"] + grouped["igst"]
+    totals = grouped[_TOTAL_KEYS].astype(np.int64)
+    if invoice_ids is None:
+        totals.index = [None] * len(totals)
+    return lines, totals
+
+def compute_lines(qty, unit_price, rate, seller_state, buyer_state,
+                  invoice_ids=None, rounding=DEFAULT_ROUNDING):
+    """
+    Vectorised compute_line over whole invoices or bulk batches.
+    qty, unit_price and rate are array-likes of equal length; states may be
+    scalars or per-line arrays. Returns (lines, totals): a DataFrame with
+    taxable/cgst/sgst/igst/line_total columns in rupees and a dict of the
+    batch totals (taxable_value, cgst, sgst, igst, grand_total), summed over
+    invoices after applying the rounding policy within each one.
+    """
+    lines, totals = compute_lines_paise(qty, unit_price, rate, seller_state, buyer_state,
+                                        invoice_ids=invoice_ids, rounding=rounding)
+    return lines / 100, {k: from_paise(totals[k].sum()) for k in _TOTAL_KEYS}
 
 def money(val):
-    """Round to 2 decimals consistently for money values."""
-    return round(float(val), 2)
+    """Round to 2 decimals (half-up, via integer paise) consistently for money values."""
+    return from_paise(to_paise(val))
 
+def sum_money(values):
+    """Exact sum of rupee amounts, accumulated in integer paise."""
+    return from_paise(int(to_paise_array(values).sum()))
@@ -2,54 +2,141 @@ import io
 import re
 import pandas as pd # type: ignore
 from PIL import Image # type: ignore
-import pytesseract # type: ignore
 import pdfplumber # type: ignore
-from typing import List, Dict
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple
+from extraction_cache import ExtractionCache
+from field_extractor import DEFAULT_EXTRACTOR
+from pdf_items import PdfItemTable, iter_pdf_pages
+from ocr import ocr_image
+from sheet_items import items_frame, read_csv_items, read_excel_items
+from hsn_lookup import normalize_hsn_code
 
-def _text_from_pdf_bytes(pdf_bytes: bytes) -> str:
-    text = ""
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-    except Exception:
-        text = ""
-    return text
+# Bump whenever extraction output changes so stale cache entries are ignored
+EXTRACTOR_VERSION = 7
+
+# Resolution scanned (image-only) PDF pages are rasterised at for OCR
+OCR_DPI = 300
+
+_ITEM_LINE_RE = re.compile(r"(.{3,100}?)\s+(\d{1,4})\s+([\d,]*\.\d{1,2}|\d+)")
+_PARTY_SUFFIX_RE = re.compile(r'[,\-]\s*(GSTIN|GST|State|Address).*', re.IGNORECASE)
+
+_cache = None
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
+
+def _pdf_pages(pdf_bytes: bytes, tables: bool = True, ocr_dpi: int = OCR_DPI,
+               ocr_workers: int = None) -> Tuple[List[str], List[pd.DataFrame]]:
+    """Per-page text, read lazily page by page, plus the item table when tables=True.
+
+    Pages with a text layer use it directly. Pages with images but no text (scans)
+    are rasterised at ocr_dpi and OCR'd afterwards, see _ocr_pdf_pages; a page whose
+    OCR failed is None. The item
+    table is read from native table/word-position data; once its total row is
+    reached the remaining pages are only text-extracted. Raises if the PDF cannot
+    be opened or parsed.
+    """
+    pages, scanned = [], []
+    reader = PdfItemTable() if tables else None
+    for page in iter_pdf_pages(pdf_bytes):
+        text = page.extract_text() or ""
+        if not text.strip() and page.images:
+            scanned.append(page.page_number - 1)
+        pages.append(text)
+        if reader is not None and not reader.done:
+            try:
+                reader.feed(page)
+            except Exception:
+                reader.done = True  # odd layout: fall back to the text regex
+    if scanned:
+        for index, text in zip(scanned, _ocr_pdf_pages(pdf_bytes, scanned, ocr_dpi, ocr_workers)):
+            pages[index] = text
+    return pages, [reader.frame()] if reader is not None and reader.rows else []
+
+def _ocr_pdf_page_batch(pdf_bytes: bytes, indexes: List[int], dpi: int) -> List[str]:
+    """Rasterise and OCR the given pages; opens the PDF once per batch (pool worker entry point)."""
+    texts = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for index in indexes:
+            try:
+                texts.append(_ocr_image(pdf.pages[index].to_image(resolution=dpi).original, dpi))
+            except Exception:
+                texts.append(None)
+    return texts
 
-def _ocr_image_bytes(img_bytes: bytes) -> str:
+def _ocr_pdf_pages(pdf_bytes: bytes, indexes: List[int], dpi: int = OCR_DPI,
+                   workers: int = None) -> List[str]:
+    """OCR text for the given pages, in order, spread over `workers` processes
+    (default: CPU count); in-process for a single page or workers == 1. None marks
+    a page whose OCR failed."""
+    workers = min(workers or os.cpu_count() or 1, len(indexes))
     try:
-        img = Image.open(io.BytesIO(img_bytes))
-        return pytesseract.image_to_string(img)
+        if workers == 1:
+            return _ocr_pdf_page_batch(pdf_bytes, indexes, dpi)
+        # one contiguous run of pages per worker, so each opens the PDF once
+        size = -(-len(indexes) // workers)
+        batches = [indexes[i:i + size] for i in range(0, len(indexes), size)]
+        with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+            results = pool.map(_ocr_pdf_page_batch, [pdf_bytes] * len(batches), batches, [dpi] * len(batches))
+            return [text for batch in results for text in batch]
     except Exception:
-        return ""
+        return [None] * len(indexes)
+
+def _ocr_image(img, dpi: int = None) -> str:
+    """tesseract on a preprocessed copy (see ocr.preprocess_for_ocr); dpi if known."""
+    return ocr_image(img, source_dpi=dpi)
 
-def ocr_extract_invoice_items(file_bytes: bytes, filename: str) -> List[Dict]:
+def extract_document(file_bytes: bytes, filename: str, pdf_tables: bool = True,
+                     ocr_dpi: int = OCR_DPI, ocr_workers: int = None) -> Dict:
+    """Parse an uploaded file exactly once.
+
+    Returns {"text": full text, "pages": per-page text, "tables": list of DataFrames,
+    "incomplete": True if OCR failed on any scanned PDF page (its text is then "")}.
+    The same document feeds both field detection and item extraction, so PDFs are
+    parsed by one library, images are OCR'd once and spreadsheets are read once
+    (every sheet of a workbook, CSVs in chunks) straight into an item table.
+    With pdf_tables=True a PDF's item table is read from its layout, so born-digital
+    PDFs skip the per-line regex. Scanned PDF pages are OCR'd at ocr_dpi across
+    ocr_workers processes. Unreadable files (corrupt PDFs, images or spreadsheets, or
+    a failed OCR of an image) raise, so callers can report the error per file.
+    """
     fname = filename.lower()
-    text = ""
+    pages, tables = [], []
     if fname.endswith(".pdf"):
-        text = _text_from_pdf_bytes(file_bytes)
+        pages, tables = _pdf_pages(file_bytes, tables=pdf_tables, ocr_dpi=ocr_dpi, ocr_workers=ocr_workers)
     elif fname.endswith((".png",".jpg",".jpeg")):
-        text = _ocr_image_bytes(file_bytes)
-    elif fname.endswith(".csv"):
-        try:
-            df = pd.read_csv(io.BytesIO(file_bytes))
-            return _items_from_dataframe(df)
-        except:
-            return []
-    elif fname.endswith(".xlsx"):
-        try:
-            df = pd.read_excel(io.BytesIO(file_bytes))
-            return _items_from_dataframe(df)
-        except:
-            return []
+        pages = [_ocr_image(Image.open(io.BytesIO(file_bytes)))]
+    elif fname.endswith((".csv", ".xlsx")):
+        # items are parsed column-wise here; the page text only needs the top rows
+        # for field detection, not a rendering of every row
+        if fname.endswith(".csv"):
+            items, head = read_csv_items(file_bytes)
+        else:
+            items, head = read_excel_items(file_bytes)
+        tables = [items]
+        pages = [head.astype(str).to_string(index=False)]
+    incomplete = any(p is None for p in pages)
+    pages = [p or "" for p in pages]
+    return {"text": "\n".join(pages), "pages": pages, "tables": tables, "incomplete": incomplete}
 
+def items_from_document(doc: Dict) -> List[Dict]:
+    """Extract line items from an extract_document() result."""
+    if doc["tables"]:
+        return _items_from_dataframe(doc["tables"][0])
+
+    text = doc["text"]
     if not text:
         return []
 
     lines = [l.strip() for l in text.splitlines() if l.strip()]
     item_lines = []
     for line in lines:
-        m = re.search(r"(.{3,100}?)\s+(\d{1,4})\s+([\d,]*\.\d{1,2}|\d+)", line)
+        m = _ITEM_LINE_RE.search(line)
         if m:
             desc = m.group(1).strip()
             qty = m.group(2)
@@ -60,28 +147,104 @@ def ocr_extract_invoice_items(file_bytes: bytes, filename: str) -> List[Dict]:
                 continue
     return item_lines
 
+def _extraction_settings(filename: str, pdf_tables: bool = True, ocr_dpi: int = OCR_DPI) -> Dict:
+    return {"version": EXTRACTOR_VERSION, "ext": os.path.splitext(filename.lower())[1],
+            "pdf_tables": pdf_tables, "ocr_dpi": ocr_dpi}
+
+def extract_invoice(file_bytes: bytes, filename: str, use_cache: bool = True,
+                    cache: ExtractionCache = None, pdf_tables: bool = True,
+                    ocr_dpi: int = OCR_DPI, ocr_workers: int = None) -> Tuple[Dict, List[Dict]]:
+    """extract_document() + items_from_document(), memoised on disk by content hash.
+
+    Cache hits return the document without "tables" (the items are already parsed).
+    Pass use_cache=False to skip the lookup and re-extract; the fresh result still
+    replaces the cached entry. Documents with no text, or where OCR failed, are
+    never stored, so a transient failure is retried on the next run.
+    """
+    cache = cache or get_extraction_cache()
+    key = cache.key(file_bytes, _extraction_settings(filename, pdf_tables, ocr_dpi))
+    hit = cache.get(key) if use_cache else None
+    if hit is not None:
+        doc = {"text": "\n".join(hit["pages"]), "pages": hit["pages"], "tables": [], "incomplete": False}
+        return doc, hit["items"]
+    doc = extract_document(file_bytes, filename, pdf_tables=pdf_tables,
+                           ocr_dpi=ocr_dpi, ocr_workers=ocr_workers)
+    items = items_from_document(doc)
+    if doc["text"].strip() and not doc["incomplete"]:
+        cache.put(key, {"pages": doc["pages"], "items": items})
+    return doc, items
+
+def ocr_extract_invoice_items(file_bytes: bytes, filename: str, use_cache: bool = True) -> List[Dict]:
+    return extract_invoice(file_bytes, filename, use_cache=use_cache)[1]
+
 def _items_from_dataframe(df: pd.DataFrame):
-    items = []
-    for _, row in df.iterrows():
-        try:
-            items.append({"Description": str(row.iloc[0]), "qty": int(row.iloc[1]), "unit_price": float(row.iloc[2])})
-        except:
-            continue
-    return items
-
-def normalize_item_dicts(items: List[Dict], hsn_lookup):
+    return items_frame(df).to_dict("records")
+
+def extract_fields_from_text(text, filename, default_seller="", extractor=None):
+    """Extract Seller, Buyer, Invoice No from text using regex patterns.
+
+    fields["rules"] names the rule that fired for each detected field.
+    """
+    fields = {
+        "seller": default_seller,  # Default to our company
+        "buyer": "Unknown Buyer",
+        "invoice_no": f"INV-{filename.split('.')[0]}",
+        "items": [],
+        "rules": {}
+    }
+
+    if not text:
+        return fields
+
+    for field, (rule, value) in (extractor or DEFAULT_EXTRACTOR).match(text).items():
+        if field in ("seller", "buyer"):
+            value = _PARTY_SUFFIX_RE.sub('', value).strip(' ,:-')
+        if value and len(value) > 3:
+            fields[field] = value
+            fields["rules"][field] = rule
+
+    return fields
+
+def extract_text_from_file(file_bytes, filename, use_cache=True):
+    """Extract text from different file types (raises if the file is unreadable)"""
+    return extract_invoice(file_bytes, filename, use_cache=use_cache)[0]["text"]
+
+def _item_hsn_code(it: Dict):
+    for key in ("hsn", "HSN", "hsn_code"):
+        if it.get(key):
+            return it[key]
+    return None
+
+def normalize_item_dicts(items: List[Dict], hsn_lookup, workers: int = -1):
+    """Attach HSN code and GST rate to each item.
+
+    Items that already carry an HSN code are resolved through the code index when
+    the catalog has that code or its 4-digit heading; the rest, including codes
+    known only by chapter, are fuzzy-matched by description in one batch.
+    """
+    resolved = {}
+    for pos, it in enumerate(items):
+        code = _item_hsn_code(it)
+        hit = hsn_lookup.lookup_code(code) if code else None
+        if hit and hit["match"] in ("code", "heading"):
+            resolved[pos] = [{**hit, "hsn_code": normalize_hsn_code(code)}]
+    pending = [pos for pos in range(len(items)) if pos not in resolved]
+    suggestions = hsn_lookup.suggest_many([items[pos].get("Description","") for pos in pending], limit=1, workers=workers)
+    resolved.update(zip(pending, suggestions))
+
     normalized = []
-    for it in items:
+    for pos, it in enumerate(items):
         desc = it.get("Description","")
-        qty = it.get("qty",1)
+        # fractional quantities (1.5 kg) are billed as is; whole ones stay ints
+        qty = float(it.get("qty",1))
+        qty = int(qty) if qty.is_integer() else qty
         unit = it.get("unit_price",0.0)
-        sugg = hsn_lookup.suggest(desc, limit=1)
+        sugg = resolved[pos]
         if sugg:
             hsn_code = sugg[0]['hsn_code']
             rate = sugg[0]['rate']
         else:
             hsn_code = ""
             rate = 0.0
-        normalized.append({"Description": desc, "qty": int(qty), "unit_price": float(unit), "hsn": hsn_code, "rate": float(rate)})
+        normalized.append({"Description": desc, "qty": qty, "unit_price": float(unit), "hsn": hsn_code, "rate": float(rate)})
     return normalized
-